@@ -0,0 +1,302 @@
+"""
+Кэш результатов поиска
+
+Ключ кэша строится из нормализованного запроса, режима, ID Vector Store,
+max_num_results и модели. Поддерживаются два бэкенда:
+    memory - LRU в памяти процесса с TTL
+    sqlite - общий файл SQLite (локальная замена Redis), разделяется
+             между воркерами uvicorn на одном хосте
+
+Обращения к блокирующим бэкендам (sqlite) из event loop выполняются в
+пуле потоков через SearchCache.aget / aset / aclear / astats.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+
+class CacheBackend(Protocol):
+    """Интерфейс бэкенда кэша"""
+
+    def get(self, key: str) -> Optional[dict]: ...
+
+    def set(self, key: str, value: dict) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def __len__(self) -> int: ...
+
+
+class MemoryCacheBackend:
+    """LRU-кэш в памяти процесса с ограничением размера и TTL"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteCacheBackend:
+    """Кэш в файле SQLite с LRU-вытеснением и TTL
+
+    Подходит как локальная замена Redis: все воркеры uvicorn на хосте
+    видят одни и те же записи.
+
+    Время последнего обращения (для LRU) не пишется при каждом чтении, а
+    копится в памяти и сохраняется вместе со следующей записью. Если файл
+    заблокирован другим воркером дольше busy_timeout, чтение считается
+    промахом, а запись пропускается - ожидание блокировки не задерживает поиск.
+    Очистка, не выполненная из-за блокировки, откладывается: до следующей
+    успешной записи все чтения - промахи.
+    """
+
+    # Вызовы блокируют поток: SearchCache выполняет их в пуле потоков
+    blocking = True
+
+    def __init__(self, path: str, max_size: int = 1024, ttl: float = 3600, busy_timeout: float = 0.05):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self.lock_errors = 0
+        self._lock = threading.Lock()
+        self._accessed: dict[str, float] = {}
+        self._clear_pending = False
+        self._size = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            if self._clear_pending:
+                return None
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                self.lock_errors += 1
+                return None
+            # Просроченные записи удаляет следующая запись
+            if row is None or row[1] < now:
+                return None
+            self._accessed[key] = now
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+            try:
+                self._write(key, value, now, accessed)
+            except sqlite3.OperationalError:
+                self.lock_errors += 1
+                self._conn.rollback()
+
+    def _write(self, key: str, value: dict, now: float, accessed: dict[str, float]):
+        """Сохранить запись, накопленные обращения и вытеснить лишнее одной транзакцией"""
+        if self._clear_pending:
+            self._conn.execute("DELETE FROM search_cache")
+            accessed = {}
+        if accessed:
+            self._conn.executemany(
+                "UPDATE search_cache SET accessed_at = ? WHERE key = ?",
+                [(at, k) for k, at in accessed.items()],
+            )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO search_cache (key, value, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now),
+        )
+        self._conn.execute("DELETE FROM search_cache WHERE expires_at < ?", (now,))
+        overflow = self._conn.execute(
+            "DELETE FROM search_cache WHERE key IN ("
+            " SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        ).rowcount
+        self.evictions += max(overflow, 0)
+        self._conn.commit()
+        self._clear_pending = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._accessed = {}
+            self._clear_pending = True
+            try:
+                self._conn.execute("DELETE FROM search_cache")
+                self._conn.commit()
+            except sqlite3.OperationalError:
+                # Записи удалит следующая запись, до нее чтения - промахи
+                self.lock_errors += 1
+                self._conn.rollback()
+                return
+            self._clear_pending = False
+
+    def __len__(self) -> int:
+        """Число записей (при блокировке файла - последнее известное)"""
+        with self._lock:
+            if self._clear_pending:
+                return 0
+            try:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            except sqlite3.OperationalError:
+                self.lock_errors += 1
+            return self._size
+
+
+def normalize_query(query: str) -> str:
+    """Нормализовать запрос: регистр, пробелы и завершающая пунктуация"""
+    query = re.sub(r"\s+", " ", query.casefold()).strip()
+    return query.rstrip("?!.;, ")
+
+
+class SearchCache:
+    """Кэш результатов search_in_store со счетчиками попаданий
+
+    Кроме hit/miss считает сэкономленное время upstream-запросов и токены,
+    чтобы можно было оценить выигрыш по задержке и стоимости.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def make_key(query: str, mode: str, store_id: str, max_num_results: int, model: str) -> str:
+        """Ключ кэша для параметров поиска"""
+        payload = json.dumps(
+            [normalize_query(query), mode, store_id, max_num_results, model], ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Получить результат из кэша и обновить счетчики"""
+        return self._count(self.backend.get(key))
+
+    async def aget(self, key: str) -> Optional[dict]:
+        """get для event loop: блокирующий бэкенд вызывается в пуле потоков"""
+        if getattr(self.backend, "blocking", False):
+            return self._count(await asyncio.to_thread(self.backend.get, key))
+        return self.get(key)
+
+    def _count(self, entry: Optional[dict]) -> Optional[dict]:
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += entry.get("elapsed", 0.0)
+        self.saved_tokens += entry.get("tokens", 0)
+        return entry["result"]
+
+    def set(self, key: str, result: dict, elapsed: float) -> None:
+        """Сохранить результат вместе с затраченным временем и токенами"""
+        self.backend.set(key, self._entry(result, elapsed))
+
+    async def aset(self, key: str, result: dict, elapsed: float) -> None:
+        """set для event loop: блокирующий бэкенд вызывается в пуле потоков"""
+        if getattr(self.backend, "blocking", False):
+            await asyncio.to_thread(self.backend.set, key, self._entry(result, elapsed))
+        else:
+            self.set(key, result, elapsed)
+
+    @staticmethod
+    def _entry(result: dict, elapsed: float) -> dict:
+        usage = result.get("usage") or (result.get("raw_response") or {}).get("usage") or {}
+        return {
+            "result": result,
+            "elapsed": elapsed,
+            "tokens": usage.get("total_tokens", 0),
+        }
+
+    def clear(self) -> None:
+        """Инвалидировать все записи"""
+        self.backend.clear()
+
+    async def aclear(self) -> None:
+        """clear для event loop: блокирующий бэкенд вызывается в пуле потоков"""
+        if getattr(self.backend, "blocking", False):
+            await asyncio.to_thread(self.backend.clear)
+        else:
+            self.clear()
+
+    def stats(self, size: Optional[int] = None) -> dict:
+        """Счетчики кэша (для процесса текущего воркера)"""
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend) if size is None else size,
+            "max_size": self.backend.max_size,
+            "ttl": self.backend.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.backend.evictions,
+            "lock_errors": getattr(self.backend, "lock_errors", 0),
+            "saved_seconds": round(self.saved_seconds, 3),
+            "saved_tokens": self.saved_tokens,
+        }
+
+    async def astats(self) -> dict:
+        """stats для event loop: размер блокирующего бэкенда считается в пуле потоков"""
+        if getattr(self.backend, "blocking", False):
+            return self.stats(await asyncio.to_thread(len, self.backend))
+        return self.stats()
+
+
+def create_search_cache(
+    backend: str, max_size: int, ttl: float, path: str
+) -> Optional[SearchCache]:
+    """Создать кэш по имени бэкенда ("memory", "sqlite" или "none")"""
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return SearchCache(MemoryCacheBackend(max_size=max_size, ttl=ttl))
+    if backend == "sqlite":
+        return SearchCache(SqliteCacheBackend(path, max_size=max_size, ttl=ttl))
+    raise ValueError(f"Неизвестный бэкенд кэша: {backend}")
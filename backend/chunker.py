@@ -0,0 +1,274 @@
+"""
+Подготовка JSONL файла с чанками для режима "chunks"
+
+Превращает текстовый корпус (например, faq_demo_chunks.txt) в JSONL, где
+каждая строка - {"body": ...}, и проверяет готовые JSONL файлы перед загрузкой.
+
+Разбиение идет по границам записей: строки "Вопрос:"/"Question:" и
+заголовки Markdown начинают новый чанк, поэтому вопрос и ответ остаются
+вместе. Записи длиннее бюджета токенов делятся по абзацам и предложениям,
+каждая часть получает заголовок записи для контекста.
+
+Обработка потоковая: память не зависит от размера входного файла.
+Разбиение крупных записей можно распараллелить на несколько процессов.
+
+Пример:
+    uv run python -m backend.chunker build data/faq_demo_chunks.txt -o data/faq_chunks.jsonl
+    uv run python -m backend.chunker validate data/faq_chunks_demo_chunks.jsonl
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import pathlib
+import re
+import sys
+from typing import Iterable, Iterator, Optional
+
+
+# Начало новой записи: вопрос FAQ или заголовок Markdown
+BOUNDARY_RE = re.compile(r"^(#{1,6}\s|Вопрос:|Question:|Q:)", re.IGNORECASE)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+DEFAULT_MAX_TOKENS = 800
+DEFAULT_MAX_LINE_BYTES = 64 * 1024
+
+# Сколько записей держать в памяти на один процесс при параллельной обработке
+WINDOW_PER_WORKER = 256
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное число токенов: слова и знаки препинания"""
+    return len(TOKEN_RE.findall(text))
+
+
+def iter_records(lines: Iterable[str]) -> Iterator[str]:
+    """Сгруппировать строки в записи по границам вопросов и заголовков
+
+    Если в тексте нет ни одной границы, записями считаются абзацы.
+    """
+    current: list[str] = []
+    seen_boundary = False
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if BOUNDARY_RE.match(line):
+            seen_boundary = True
+            if current:
+                yield "\n".join(current).strip()
+            current = [line]
+        elif not line.strip() and not seen_boundary:
+            if current:
+                yield "\n".join(current).strip()
+            current = []
+        elif line.strip() or current:
+            current.append(line)
+
+    if current:
+        yield "\n".join(current).strip()
+
+
+def split_record(record: str, max_tokens: int) -> list[str]:
+    """Разбить запись на чанки не длиннее max_tokens
+
+    Короткая запись возвращается целиком. Длинная делится по абзацам, затем
+    по предложениям, а фрагменты без границ предложений (таблицы, код,
+    сплошной текст) - окнами токенов. Первая строка записи (вопрос или
+    заголовок) повторяется в начале каждой части, если она не длиннее
+    половины бюджета.
+    """
+    if estimate_tokens(record) <= max_tokens:
+        return [record]
+
+    header, _, rest = record.partition("\n")
+    if estimate_tokens(header) > max_tokens // 2:
+        header, rest = "", record
+    prefix = f"{header}\n" if header else ""
+    budget = max(max_tokens - estimate_tokens(header), 1)
+
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", rest):
+        if estimate_tokens(paragraph) <= budget:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_RE.split(paragraph):
+            if estimate_tokens(sentence) <= budget:
+                pieces.append(sentence)
+            else:
+                pieces.extend(static_chunks(sentence, budget, 0))
+
+    chunks = []
+    current: list[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        piece = piece.strip()
+        if not piece:
+            continue
+        tokens = estimate_tokens(piece)
+        if current and current_tokens + tokens > budget:
+            chunks.append(prefix + "\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(prefix + "\n".join(current))
+    return chunks
+
+
+def static_chunks(text: str, max_chunk_size_tokens: int, chunk_overlap_tokens: int) -> list[str]:
+    """Статическое чанкование: окна токенов с перекрытием
+
+    Приближение стратегии "static" Vector Store, без учета границ записей.
+    """
+    spans = [m.span() for m in TOKEN_RE.finditer(text)]
+    step = max(max_chunk_size_tokens - chunk_overlap_tokens, 1)
+    chunks = []
+    for start in range(0, len(spans), step):
+        window = spans[start:start + max_chunk_size_tokens]
+        chunks.append(text[window[0][0]:window[-1][1]])
+        if start + max_chunk_size_tokens >= len(spans):
+            break
+    return chunks
+
+
+def _split_for_pool(args: tuple[str, int]) -> list[str]:
+    return split_record(*args)
+
+
+def iter_chunks(
+    lines: Iterable[str],
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    workers: int = 1
+) -> Iterator[str]:
+    """Поток чанков из строк входного текста
+
+    При workers > 1 записи обрабатываются пулом процессов окнами
+    фиксированного размера, чтобы не читать весь вход в память.
+    """
+    records = iter_records(lines)
+
+    if workers <= 1:
+        for record in records:
+            yield from split_record(record, max_tokens)
+        return
+
+    window = workers * WINDOW_PER_WORKER
+    with multiprocessing.Pool(workers) as pool:
+        while True:
+            batch = [(record, max_tokens) for record in itertools.islice(records, window)]
+            if not batch:
+                break
+            for chunks in pool.imap(_split_for_pool, batch, chunksize=WINDOW_PER_WORKER // 4):
+                yield from chunks
+
+
+def build_jsonl(
+    input_path: pathlib.Path,
+    output_path: pathlib.Path,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    workers: int = 1
+) -> int:
+    """Построить JSONL файл с чанками
+
+    Returns:
+        Количество записанных чанков
+    """
+    count = 0
+    with open(input_path, "r", encoding="utf-8") as src, \
+            open(output_path, "w", encoding="utf-8") as dst:
+        for chunk in iter_chunks(src, max_tokens, workers):
+            dst.write(json.dumps({"body": chunk}, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def validate_line(
+    line: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    max_line_bytes: int = DEFAULT_MAX_LINE_BYTES
+) -> Optional[str]:
+    """Проверить одну строку JSONL
+
+    Returns:
+        Описание ошибки или None, если строка корректна
+    """
+    if len(line.encode("utf-8")) > max_line_bytes:
+        return f"строка длиннее {max_line_bytes} байт"
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        return f"некорректный JSON: {e.msg}"
+    if not isinstance(record, dict):
+        return "строка должна быть JSON объектом"
+    body = record.get("body")
+    if not isinstance(body, str):
+        return "поле body отсутствует или не является строкой"
+    if not body.strip():
+        return "поле body пустое"
+    tokens = estimate_tokens(body)
+    if tokens > max_tokens:
+        return f"body содержит ~{tokens} токенов (максимум {max_tokens})"
+    return None
+
+
+def validate_jsonl(
+    path: pathlib.Path,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    max_line_bytes: int = DEFAULT_MAX_LINE_BYTES
+) -> Iterator[tuple[int, str]]:
+    """Потоково проверить JSONL файл с чанками
+
+    Yields:
+        Пары (номер строки, описание ошибки)
+    """
+    empty = True
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            empty = False
+            error = validate_line(line, max_tokens, max_line_bytes)
+            if error:
+                yield line_no, error
+    if empty:
+        yield 0, "файл не содержит чанков"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подготовка и проверка JSONL файла с чанками")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Построить JSONL из текстового файла")
+    build.add_argument("input", type=pathlib.Path, help="Входной текстовый файл")
+    build.add_argument("-o", "--output", type=pathlib.Path, required=True, help="Выходной JSONL")
+    build.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    build.add_argument("--workers", type=int, default=1, help="Число процессов")
+
+    validate = commands.add_parser("validate", help="Проверить JSONL файл с чанками")
+    validate.add_argument("input", type=pathlib.Path, help="JSONL файл")
+    validate.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    validate.add_argument("--max-line-bytes", type=int, default=DEFAULT_MAX_LINE_BYTES)
+    validate.add_argument("--max-errors", type=int, default=20, help="Сколько ошибок показать")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_jsonl(args.input, args.output, args.max_tokens, args.workers)
+        print(f"Записано {count} чанков в {args.output}")
+        return
+
+    errors = 0
+    for line_no, error in validate_jsonl(args.input, args.max_tokens, args.max_line_bytes):
+        errors += 1
+        if errors <= args.max_errors:
+            print(f"{args.input}:{line_no}: {error}")
+    if errors:
+        print(f"Найдено ошибок: {errors}")
+        sys.exit(1)
+    print(f"{args.input}: OK")
+
+
+if __name__ == "__main__":
+    main()
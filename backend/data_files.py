@@ -0,0 +1,155 @@
+"""
+Постраничная отдача файлов данных
+
+Файлы читаются страницами по N строк (для JSONL - N записей) с курсором в
+виде смещения в байтах, поэтому следующую страницу можно прочитать без
+сканирования начала файла. Небольшие файлы держатся в памяти и
+перечитываются только при изменении mtime или размера.
+
+Для условных запросов используются ETag и Last-Modified, для отдачи
+файла целиком или по частям - HTTP Range (bytes=start-end).
+"""
+
+import io
+import os
+import pathlib
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Iterator, Optional
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Размер блока при потоковой отдаче файла
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def file_version(stat: os.stat_result) -> str:
+    """Версия файла для ETag: размер и mtime в наносекундах"""
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def make_etag(stat: os.stat_result, *parts) -> str:
+    """ETag файла (или его страницы, если переданы параметры страницы)"""
+    suffix = "".join(f"-{part}" for part in parts)
+    return f'"{file_version(stat)}{suffix}"'
+
+
+def last_modified(stat: os.stat_result) -> str:
+    return formatdate(stat.st_mtime, usegmt=True)
+
+
+def not_modified(headers, etag: str, stat: os.stat_result) -> bool:
+    """Проверить If-None-Match / If-Modified-Since (If-None-Match имеет приоритет)"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat.st_mtime) <= since
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Разобрать заголовок Range с одним диапазоном
+
+    Returns:
+        (start, end) включительно или None, если заголовка нет
+
+    Raises:
+        ValueError: диапазон некорректен или выходит за пределы файла
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(f"Неподдерживаемый Range: {header}")
+    start, end = match.groups()
+    if start == "":
+        # bytes=-N: последние N байт
+        length = int(end)
+        if length == 0:
+            raise ValueError("Пустой диапазон")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Диапазон вне файла размером {size} байт")
+    return start, end
+
+
+def iter_file_range(path: pathlib.Path, start: int, end: int) -> Iterator[bytes]:
+    """Прочитать байты [start, end] блоками"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def read_page(f: BinaryIO, cursor: int, limit: int) -> tuple[str, int, Optional[int]]:
+    """Прочитать до limit строк, начиная со смещения cursor
+
+    Если cursor указывает в середину строки, чтение начинается со следующей.
+
+    Returns:
+        Кортеж (текст страницы, число строк, курсор следующей страницы или None)
+    """
+    if cursor > 0:
+        f.seek(cursor - 1)
+        if f.read(1) != b"\n":
+            f.readline()
+    lines = []
+    for _ in range(limit):
+        line = f.readline()
+        if not line:
+            break
+        lines.append(line)
+    next_cursor = f.tell()
+    has_more = bool(lines) and f.read(1) != b""
+    content = b"".join(lines).decode("utf-8", errors="replace")
+    return content, len(lines), next_cursor if has_more else None
+
+
+class DataFileCache:
+    """Содержимое небольших файлов в памяти с инвалидацией по mtime и размеру"""
+
+    def __init__(self, max_file_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self._files: dict[pathlib.Path, tuple[str, bytes]] = {}
+
+    def get(self, path: pathlib.Path, stat: os.stat_result) -> Optional[bytes]:
+        """Содержимое файла из кэша (файл читается при промахе) или None для больших файлов"""
+        if stat.st_size > self.max_file_bytes:
+            return None
+        version = file_version(stat)
+        cached = self._files.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+        data = path.read_bytes()
+        self._files[path] = (version, data)
+        return data
+
+    def read_page(
+        self,
+        path: pathlib.Path,
+        stat: os.stat_result,
+        cursor: int,
+        limit: int
+    ) -> tuple[str, int, Optional[int]]:
+        """Страница файла: из памяти для небольших файлов, иначе с диска"""
+        data = self.get(path, stat)
+        if data is not None:
+            return read_page(io.BytesIO(data), cursor, limit)
+        with open(path, "rb") as f:
+            return read_page(f, cursor, limit)
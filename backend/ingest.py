@@ -0,0 +1,346 @@
+"""
+Пакетная загрузка корпуса документов в Vector Store
+
+Обходит директорию, загружает файлы с ограниченным параллелизмом и
+подключает их к Vector Store через file batches. Прогресс сохраняется в
+файл состояния, поэтому прерванный запуск можно продолжить: уже
+подключенные файлы пропускаются, а повторная загрузка тех же байтов
+заменяется ссылкой на существующий файл (манифест загрузок).
+
+С --collection готовый Vector Store регистрируется как именованная
+коллекция, и по нему можно искать через /api/search (поле collection).
+
+Пример:
+    uv run python -m backend.ingest data/corpus --create "FAQ Corpus" --workers 8
+    uv run python -m backend.ingest data/corpus --store-id vs_123 --state corpus.state.json
+    uv run python -m backend.ingest data/team_a --create "Team A" --collection team-a --tenant team-a
+"""
+
+import argparse
+import asyncio
+import mimetypes
+import os
+import pathlib
+import time
+from typing import Iterator, Optional
+
+from backend import main
+from backend.registry import FileManifest, JsonFileStore, hash_file
+
+
+# Максимум файлов в одном file batch
+BATCH_SIZE = 500
+
+# Как часто сохранять состояние во время загрузки (в файлах)
+STATE_SAVE_EVERY = 50
+
+DEFAULT_EXTENSIONS = (".txt", ".md", ".jsonl", ".html", ".pdf", ".docx")
+
+
+def iter_files(root: pathlib.Path, extensions: tuple[str, ...]) -> Iterator[pathlib.Path]:
+    """Обойти директорию в детерминированном порядке"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = pathlib.Path(dirpath) / name
+            if path.suffix.lower() in extensions and not name.startswith("."):
+                yield path
+
+
+def file_kind(path: pathlib.Path) -> str:
+    """Тип файла: "chunks" для готовых чанков JSONL, "auto" для остальных"""
+    return "chunks" if path.suffix.lower() == ".jsonl" else "auto"
+
+
+def upload_params(path: pathlib.Path) -> tuple[str, Optional[dict]]:
+    """Content-Type и extra_body для загрузки файла"""
+    if file_kind(path) == "chunks":
+        return "application/jsonlines", {"format": "chunks"}
+    content_type, _ = mimetypes.guess_type(path.name)
+    return content_type or "application/octet-stream", None
+
+
+class IngestState(JsonFileStore):
+    """Состояние загрузки: ID Vector Store и статус каждого файла
+
+    Формат файла:
+        {"store_id": ..., "files": {<путь>: {"hash", "file_id", "kind", "bytes", "status", "error"}}}
+    status: uploaded, attached или failed
+    """
+
+    def __init__(self, path: pathlib.Path):
+        super().__init__(path, {"store_id": None, "files": {}})
+        self.data = self.read()
+
+    def save(self):
+        with self.update() as data:
+            data.clear()
+            data.update(self.data)
+
+
+class Stats:
+    """Счетчики пропускной способности"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.uploaded = 0
+        self.reused = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def report(self, prefix: str = ""):
+        elapsed = time.perf_counter() - self.started
+        done = self.uploaded + self.reused
+        print(
+            f"{prefix}загружено {self.uploaded}, повторно использовано {self.reused}, "
+            f"пропущено {self.skipped}, ошибок {self.failed} | "
+            f"{done / elapsed if elapsed else 0:.1f} файлов/с, "
+            f"{self.bytes / 1024 / 1024 / elapsed if elapsed else 0:.2f} МБ/с"
+        )
+
+
+def record_failure(
+    key: str,
+    state: IngestState,
+    stats: Stats,
+    error: Exception,
+    data_hash: Optional[str] = None
+):
+    """Отметить файл как неудачный (он будет загружен повторно)"""
+    stats.failed += 1
+    state.data["files"][key] = {"hash": data_hash, "status": "failed", "error": str(error)}
+    print(f"Не удалось загрузить {key}: {error}")
+
+
+async def upload_one(path: pathlib.Path, key: str, state: IngestState, stats: Stats):
+    """Загрузить один файл с повторами и записать результат в состояние
+
+    Файл мог исчезнуть или стать недоступным после обхода директории:
+    такие ошибки, как и ошибки загрузки, записываются в состояние как failed.
+    """
+    content_type, extra_body = upload_params(path)
+    data_hash = None
+    try:
+        size = path.stat().st_size
+        data_hash = await asyncio.to_thread(hash_file, path)
+        manifest_key = FileManifest.content_key(data_hash, "assistants", extra_body)
+        reused = await asyncio.to_thread(main.file_manifest.get, manifest_key) is not None
+        file_id = await main.call_with_retry(
+            f"Загрузка {key}", main.upload_path, path, content_type, extra_body
+        )
+    except Exception as e:
+        record_failure(key, state, stats, e, data_hash)
+        return
+
+    if reused:
+        stats.reused += 1
+    else:
+        stats.uploaded += 1
+        stats.bytes += size
+    state.data["files"][key] = {
+        "hash": data_hash,
+        "file_id": file_id,
+        "kind": file_kind(path),
+        "bytes": size,
+        "status": "uploaded"
+    }
+
+
+async def unchanged(path: pathlib.Path, data_hash: str) -> bool:
+    """Совпадает ли хэш файла с сохраненным (недоступный файл считается измененным)"""
+    try:
+        return await asyncio.to_thread(hash_file, path) == data_hash
+    except OSError:
+        return False
+
+
+async def upload_all(
+    root: pathlib.Path,
+    extensions: tuple[str, ...],
+    state: IngestState,
+    stats: Stats,
+    workers: int
+):
+    """Загрузить все новые и измененные файлы, держа в полете не более workers"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    processed = 0
+
+    async def worker():
+        nonlocal processed
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            path, key = item
+            try:
+                await upload_one(path, key, state, stats)
+            except Exception as e:
+                # Ошибка одного файла не должна останавливать воркер: иначе
+                # очередь заполнится и обход директории зависнет на put
+                record_failure(key, state, stats, e)
+            processed += 1
+            if processed % STATE_SAVE_EVERY == 0:
+                state.save()
+                stats.report(f"[{processed}] ")
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    for path in iter_files(root, extensions):
+        key = str(path.relative_to(root))
+        entry = state.data["files"].get(key)
+        if entry and entry["status"] == "attached" and await unchanged(path, entry["hash"]):
+            stats.skipped += 1
+            continue
+        await queue.put((path, key))
+    for _ in tasks:
+        await queue.put(None)
+    await asyncio.gather(*tasks)
+    state.save()
+
+
+async def attach_batch(store_id: str, keys: list[str], state: IngestState, chunking: dict):
+    """Подключить файлы к Vector Store одним file batch"""
+    files = state.data["files"]
+    kind = files[keys[0]]["kind"]
+    params = {"file_ids": [files[key]["file_id"] for key in keys]}
+    if kind == "auto":
+        params["chunking_strategy"] = {"type": "static", "static": chunking}
+
+    batch = await main.call_with_retry(
+        "Создание file batch",
+        main.async_client.vector_stores.file_batches.create,
+        vector_store_id=store_id,
+        **params
+    )
+    batch = await main.wait_for_file_batch(store_id, batch.id)
+
+    failed_ids = set()
+    if batch.file_counts.failed or batch.status != "completed":
+        async for file_obj in main.async_client.vector_stores.file_batches.list_files(
+            batch.id, vector_store_id=store_id, filter="failed"
+        ):
+            failed_ids.add(file_obj.id)
+
+    for key in keys:
+        if files[key]["file_id"] in failed_ids:
+            files[key]["status"] = "failed"
+            files[key]["error"] = "ошибка индексации"
+        else:
+            files[key]["status"] = "attached"
+    print(f"File batch {batch.id}: {len(keys) - len(failed_ids)} подключено, {len(failed_ids)} ошибок")
+
+
+async def attach_all(store_id: str, state: IngestState, chunking: dict):
+    """Подключить все загруженные файлы пачками по BATCH_SIZE"""
+    by_kind: dict[str, list[str]] = {}
+    for key, entry in state.data["files"].items():
+        if entry["status"] == "uploaded":
+            by_kind.setdefault(entry["kind"], []).append(key)
+
+    for keys in by_kind.values():
+        for i in range(0, len(keys), BATCH_SIZE):
+            await attach_batch(store_id, keys[i:i + BATCH_SIZE], state, chunking)
+            state.save()
+
+
+async def ingest(
+    root: pathlib.Path,
+    state: IngestState,
+    store_id: Optional[str],
+    create_name: Optional[str],
+    workers: int,
+    retries: int,
+    extensions: tuple[str, ...],
+    chunking: dict
+) -> str:
+    """Загрузить директорию в Vector Store
+
+    Returns:
+        ID Vector Store
+    """
+    store_id = store_id or state.data["store_id"]
+    if not store_id:
+        vector_store = await main.async_client.vector_stores.create(
+            name=create_name or root.name,
+            expires_after={"anchor": "last_active_at", "days": 1}
+        )
+        store_id = vector_store.id
+        print(f"Vector Store создан с ID: {store_id}")
+    state.data["store_id"] = store_id
+    state.save()
+
+    stats = Stats()
+    for attempt in range(retries + 1):
+        if attempt:
+            failed = [k for k, v in state.data["files"].items() if v["status"] == "failed"]
+            if not failed:
+                break
+            print(f"\nПовтор {attempt}/{retries}: {len(failed)} файлов с ошибками")
+            for key in failed:
+                del state.data["files"][key]
+            stats.failed = 0
+
+        await upload_all(root, extensions, state, stats, workers)
+        stats.report("Загрузка: ")
+
+        attach_started = time.perf_counter()
+        await attach_all(store_id, state, chunking)
+        print(f"Индексация: {time.perf_counter() - attach_started:.1f} с")
+
+    statuses = [v["status"] for v in state.data["files"].values()]
+    print(
+        f"\nГотово: Vector Store {store_id}, подключено {statuses.count('attached')}, "
+        f"ошибок {statuses.count('failed')}"
+    )
+    stats.report("Итого: ")
+    return store_id
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Загрузка корпуса документов в Vector Store")
+    parser.add_argument("directory", type=pathlib.Path, help="Директория с документами")
+    parser.add_argument("--store-id", help="ID существующего Vector Store")
+    parser.add_argument("--create", metavar="NAME", help="Имя нового Vector Store")
+    parser.add_argument("--state", type=pathlib.Path, help="Файл состояния для возобновления")
+    parser.add_argument("--workers", type=int, default=8, help="Параллельных загрузок")
+    parser.add_argument("--retries", type=int, default=2, help="Повторов для файлов с ошибками")
+    parser.add_argument(
+        "--extensions", default=",".join(DEFAULT_EXTENSIONS), help="Расширения файлов через запятую"
+    )
+    parser.add_argument("--collection", help="Зарегистрировать Vector Store как коллекцию")
+    parser.add_argument("--tenant", help="Арендатор коллекции (по умолчанию - имя коллекции)")
+    parser.add_argument("--max-chunk-size-tokens", type=int, default=800)
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=400)
+    args = parser.parse_args()
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} не является директорией")
+
+    state_path = args.state or pathlib.Path(f".ingest_{args.directory.resolve().name}.json")
+    extensions = tuple(f".{e.strip().lstrip('.').lower()}" for e in args.extensions.split(","))
+    chunking = {
+        "max_chunk_size_tokens": args.max_chunk_size_tokens,
+        "chunk_overlap_tokens": args.chunk_overlap_tokens
+    }
+
+    # Параллелизм загрузки в этом процессе задается --workers
+    main.upstream_semaphores["files"] = asyncio.Semaphore(args.workers)
+
+    store_id = asyncio.run(ingest(
+        args.directory,
+        IngestState(state_path),
+        args.store_id,
+        args.create,
+        args.workers,
+        args.retries,
+        extensions,
+        chunking
+    ))
+
+    if args.collection:
+        main.collection_registry.put(args.collection, store_id, args.tenant)
+        print(f"Коллекция '{args.collection}' -> {store_id}")
+
+
+if __name__ == "__main__":
+    main_cli()
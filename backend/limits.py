@@ -0,0 +1,207 @@
+"""
+Ограничение нагрузки: лимиты арендаторов и контроль допуска к upstream
+
+TokenBucket / RateLimiter - лимит запросов в секунду для каждого
+арендатора (ведро токенов: постоянная скорость пополнения и запас на
+всплески). Интерактивный запрос при исчерпании лимита отклоняется, а
+элементы пакетного поиска дожидаются своего токена (acquire).
+
+AdmissionQueue - ограниченная очередь перед вызовами upstream: если
+выполняется и ожидает слишком много вызовов, новый сразу отклоняется
+вместо того, чтобы копить задачи в event loop и увеличивать хвост задержек.
+
+В обоих случаях вызывающий получает Overloaded с рекомендуемой паузой
+(для заголовка Retry-After).
+"""
+
+import asyncio
+import contextlib
+import math
+import time
+from typing import Optional
+
+
+class Overloaded(Exception):
+    """Запрос отклонен лимитом; retry_after - через сколько секунд повторить"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше burst в запасе"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def configure(self, rate: float, burst: float):
+        """Сменить скорость и запас без пополнения ведра"""
+        self._refill()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = min(self.tokens, burst)
+
+    def take(self, cost: float = 1.0) -> float:
+        """Списать cost токенов
+
+        Returns:
+            0, если токенов хватило, иначе время до их накопления, сек
+        """
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Ведра токенов по арендаторам с общими настройками по умолчанию
+
+    У арендатора одно ведро: если коллекции арендатора задают разные rate и
+    burst, ведро перенастраивается без пополнения. rate <= 0 отключает лимит.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.rejected = 0
+        self.delayed = 0
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def _bucket(self, tenant: str, rate: float, burst: float) -> TokenBucket:
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = self._buckets[tenant] = TokenBucket(rate, burst)
+        elif (bucket.rate, bucket.burst) != (rate, burst):
+            bucket.configure(rate, burst)
+        return bucket
+
+    def check(
+        self,
+        tenant: str,
+        cost: float = 1.0,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None
+    ):
+        """Списать токены арендатора (rate и burst переопределяют значения по умолчанию)
+
+        Raises:
+            Overloaded: лимит арендатора исчерпан
+        """
+        rate = self.rate if rate is None else rate
+        burst = self.burst if burst is None else burst
+        if rate <= 0:
+            return
+        wait = self._bucket(tenant, rate, burst).take(cost)
+        if wait:
+            self.rejected += 1
+            raise Overloaded(f"Превышен лимит запросов арендатора '{tenant}'", wait)
+
+    async def acquire(
+        self,
+        tenant: str,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None
+    ) -> float:
+        """Дождаться одного токена арендатора (для элементов пакетного поиска)
+
+        Returns:
+            Время ожидания, сек
+
+        Raises:
+            ValueError: burst меньше одного токена - ожидание бесконечно
+        """
+        rate = self.rate if rate is None else rate
+        burst = self.burst if burst is None else burst
+        if rate <= 0:
+            return 0.0
+        if burst < 1:
+            raise ValueError(f"Запас лимита арендатора '{tenant}' меньше одного запроса")
+        waited = 0.0
+        while True:
+            # Ведро перечитывается: за время ожидания его могли перенастроить
+            wait = self._bucket(tenant, rate, burst).take()
+            if not wait:
+                if waited:
+                    self.delayed += 1
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "rejected": self.rejected,
+            "delayed": self.delayed,
+            "tenants": {
+                tenant: {"rate": b.rate, "burst": b.burst, "tokens": round(b.tokens, 2)}
+                for tenant, b in self._buckets.items()
+            }
+        }
+
+
+class AdmissionQueue:
+    """Ограничение числа выполняющихся и ожидающих вызовов upstream
+
+    Retry-After оценивается по скользящему среднему длительности вызова.
+    max_pending <= 0 отключает ограничение.
+    """
+
+    def __init__(self, max_pending: int, smoothing: float = 0.2):
+        self.max_pending = max_pending
+        self.smoothing = smoothing
+        self.pending = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_seconds = 1.0
+
+    def check(self):
+        """Проверить, что в очереди есть место (без его занятия)
+
+        Raises:
+            Overloaded: очередь заполнена
+        """
+        if 0 < self.max_pending <= self.pending:
+            self.rejected += 1
+            raise Overloaded("Сервер перегружен, повторите запрос позже", self.avg_seconds)
+
+    @contextlib.contextmanager
+    def admit(self):
+        """Занять место в очереди на время вызова
+
+        Raises:
+            Overloaded: очередь заполнена
+        """
+        self.check()
+        self.pending += 1
+        self.admitted += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.pending -= 1
+            elapsed = time.perf_counter() - started
+            self.avg_seconds += self.smoothing * (elapsed - self.avg_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_seconds": round(self.avg_seconds, 3)
+        }
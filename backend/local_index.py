@@ -0,0 +1,188 @@
+"""
+Локальный поисковый индекс для JSONL файла с чанками
+
+Загружает записи {"body": ...} в компактный индекс на массивах и ищет
+без обращения к Yandex Cloud. Поддерживаемые методы:
+    bm25   - классический BM25 по словам
+    vector - скалярное произведение hashed-эмбеддингов (нужен NumPy)
+    hybrid - среднее нормированных оценок bm25 и vector
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import pathlib
+import re
+from array import array
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy нужен только для методов vector/hybrid
+    np = None
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Длина "стеммы": для русского языка обрезка слова до префикса
+# заметно повышает полноту без морфологического анализатора
+STEM_LENGTH = 6
+
+# Размерность hashed-эмбеддингов
+EMBEDDING_DIM = 512
+
+SEARCH_METHODS = ("bm25", "vector", "hybrid")
+
+
+def tokenize(text: str) -> list[str]:
+    """Разбить текст на нормализованные термы"""
+    return [token[:STEM_LENGTH] for token in TOKEN_RE.findall(text.casefold())]
+
+
+def embed(text: str) -> "np.ndarray":
+    """Hashed-эмбеддинг по символьным триграммам, нормированный по L2"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in TOKEN_RE.findall(text.casefold()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            digest = hashlib.blake2b(padded[i:i + 3].encode("utf-8"), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class LocalIndex:
+    """Индекс BM25 (и опционально векторный) поверх списка чанков
+
+    Постинги хранятся в плоских массивах (CSR): для терма t документы
+    лежат в postings_docs[offsets[t]:offsets[t + 1]], частоты - в postings_tfs.
+    """
+
+    def __init__(self, texts: list[str], filename: str = "", k1: float = 1.5, b: float = 0.75):
+        self.texts = texts
+        self.filename = filename
+        self.k1 = k1
+        self.b = b
+
+        doc_terms = [tokenize(text) for text in texts]
+        self.doc_lengths = array("I", (len(terms) for terms in doc_terms))
+        self.avg_length = (sum(self.doc_lengths) / len(texts)) if texts else 0.0
+
+        postings: dict[str, dict[int, int]] = {}
+        for doc_id, terms in enumerate(doc_terms):
+            for term in terms:
+                by_doc = postings.setdefault(term, {})
+                by_doc[doc_id] = by_doc.get(doc_id, 0) + 1
+
+        self.vocabulary: dict[str, int] = {}
+        self.offsets = array("I", [0])
+        self.postings_docs = array("I")
+        self.postings_tfs = array("I")
+        self.idf = array("d")
+        total = len(texts)
+        for term_id, (term, by_doc) in enumerate(postings.items()):
+            self.vocabulary[term] = term_id
+            self.postings_docs.extend(by_doc.keys())
+            self.postings_tfs.extend(by_doc.values())
+            self.offsets.append(len(self.postings_docs))
+            df = len(by_doc)
+            self.idf.append(math.log(1 + (total - df + 0.5) / (df + 0.5)))
+
+        self.embeddings = None
+        if np is not None and texts:
+            self.embeddings = np.vstack([embed(text) for text in texts])
+
+    @classmethod
+    def from_jsonl(cls, path: pathlib.Path) -> "LocalIndex":
+        """Построить индекс по JSONL файлу с полем body в каждой строке"""
+        texts = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    texts.append(json.loads(line)["body"])
+        return cls(texts, filename=path.name)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def bm25_scores(self, query: str) -> dict[int, float]:
+        """Оценки BM25 для документов, содержащих хотя бы один терм запроса"""
+        scores: dict[int, float] = {}
+        k1, b, avg_length = self.k1, self.b, self.avg_length or 1.0
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            idf = self.idf[term_id]
+            for i in range(self.offsets[term_id], self.offsets[term_id + 1]):
+                doc_id = self.postings_docs[i]
+                tf = self.postings_tfs[i]
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def vector_scores(self, query: str) -> dict[int, float]:
+        """Косинусная близость запроса ко всем документам"""
+        if self.embeddings is None:
+            raise RuntimeError("Для векторного поиска нужен установленный NumPy")
+        similarities = self.embeddings @ embed(query)
+        return {doc_id: float(score) for doc_id, score in enumerate(similarities) if score > 0}
+
+    def search(self, query: str, max_num_results: int = 3, method: str = "bm25") -> list[dict]:
+        """Найти наиболее релевантные чанки
+
+        Returns:
+            Список чанков в том же формате, что и результаты file_search.
+            Оценки нормированы в диапазон [0, 1].
+        """
+        if method not in SEARCH_METHODS:
+            raise ValueError(f"Неизвестный метод поиска: {method}")
+
+        if method == "vector":
+            scores = self.vector_scores(query)
+        else:
+            scores = _normalize(self.bm25_scores(query))
+            if method == "hybrid":
+                vector = self.vector_scores(query)
+                scores = {
+                    doc_id: (scores.get(doc_id, 0.0) + vector.get(doc_id, 0.0)) / 2
+                    for doc_id in scores.keys() | vector.keys()
+                }
+
+        top = heapq.nlargest(max_num_results, scores.items(), key=lambda item: item[1])
+        return [
+            {
+                "text": self.texts[doc_id],
+                "score": round(score, 4),
+                "file_id": f"local:{doc_id}",
+                "filename": self.filename,
+            }
+            for doc_id, score in top
+        ]
+
+
+def _normalize(scores: dict[int, float]) -> dict[int, float]:
+    """Нормировать оценки делением на максимальную"""
+    top = max(scores.values(), default=0.0)
+    if not top:
+        return scores
+    return {doc_id: score / top for doc_id, score in scores.items()}
+
+
+_cache: dict[pathlib.Path, tuple[float, LocalIndex]] = {}
+
+
+def load_local_index(path: pathlib.Path) -> Optional[LocalIndex]:
+    """Загрузить индекс для файла, перестраивая его при изменении mtime"""
+    if not path.exists():
+        return None
+    mtime = path.stat().st_mtime
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        index = LocalIndex.from_jsonl(path)
+        _cache[path] = (mtime, index)
+        print(f"Локальный индекс построен: {len(index)} чанков из {path.name}")
+        return index
+    return cached[1]
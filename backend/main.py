@@ -6,14 +6,53 @@ AI Search Demo - Минимальный backend
 import os
 import pathlib
 import asyncio
-from typing import Optional
-from fastapi import FastAPI, HTTPException
+import functools
+import itertools
+import json
+import random
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+import httpx
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI, AsyncOpenAI
+from starlette.routing import Match
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, NotFoundError
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # orjson ускоряет сериализацию ответов, но не обязателен
+    orjson = None
+    FastJSONResponse = JSONResponse
+
+try:
+    import h2  # noqa: F401 - нужен httpx для HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from backend import metrics
+from backend.cache import SearchCache, create_search_cache
+from backend.chunker import validate_jsonl
+from backend.limits import AdmissionQueue, Overloaded, RateLimiter
+from backend.data_files import (
+    DataFileCache, iter_file_range, last_modified, make_etag, not_modified, parse_range
+)
+from backend.local_index import load_local_index
+from backend.registry import CollectionRegistry, FileManifest, StoreRegistry, config_key, hash_file
+from backend.shards import (
+    DEFAULT_SHARD_COUNT, merge_files, plan_sync, previous_files, shard_digest, split_shards,
+    stale_file_ids, write_shard
+)
+from backend.singleflight import SingleFlight
+
 # Загрузка переменных окружения из корня проекта
 env_path = pathlib.Path(__file__).parent.parent / ".env"
 load_dotenv(env_path)
@@ -23,34 +62,304 @@ YANDEX_API_KEY = os.getenv("YANDEX_API_KEY")
 YANDEX_FOLDER_ID = os.getenv("YANDEX_FOLDER_ID")
 YANDEX_CLOUD_MODEL = os.getenv("YANDEX_CLOUD_MODEL", "qwen3-235b-a22b-fp8/latest")
 
+# Адрес OpenAI-совместимого API: Yandex Cloud или локальный mock-сервер
+# (uv run python -m backend.mock_server, YANDEX_BASE_URL=http://localhost:8001/v1)
+YANDEX_CLOUD_BASE_URL = "https://ai.api.cloud.yandex.net/v1"
+YANDEX_BASE_URL = os.getenv("YANDEX_BASE_URL", YANDEX_CLOUD_BASE_URL)
+
 # Файлы данных для каждого режима
 AUTO_MODE_FILE = "faq_demo_chunks.txt"  # Файл для автоматического чанкования
 CHUNKS_MODE_FILE = "faq_chunks_demo_chunks.jsonl"  # Файл с готовыми чанками
 
-if not YANDEX_API_KEY or not YANDEX_FOLDER_ID:
+# Режимы поиска: auto и chunks используют Vector Store, local - локальный индекс
+SEARCH_MODES = ["auto", "chunks", "local"]
+LOCAL_STORE_ID = "local"
+LOCAL_RETRIEVAL_METHOD = os.getenv("LOCAL_RETRIEVAL_METHOD", "bm25")  # bm25, vector или hybrid
+
+# Максимальный размер чанка в JSONL файле режима chunks (проверяется перед загрузкой)
+CHUNKS_MAX_TOKENS = int(os.getenv("CHUNKS_MAX_TOKENS", "800"))
+
+# Лимиты параллельных запросов к каждому upstream API
+UPSTREAM_CONCURRENCY = {
+    "responses": int(os.getenv("RESPONSES_CONCURRENCY", "16")),
+    "vector_stores": int(os.getenv("VECTOR_STORES_CONCURRENCY", "8")),
+    "files": int(os.getenv("FILES_CONCURRENCY", "4")),
+}
+
+# Общий пул соединений к upstream API: размер, keep-alive, HTTP/2 и таймауты
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "32"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "120"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "auto").lower()  # auto, true или false
+
+# Таймаут (сек) и число повторов SDK для каждого типа операций:
+# search - Responses API и vector_stores.search, upload - загрузка файлов,
+# poll - опрос статуса индексов, file batches и файлов
+UPSTREAM_POLICIES = {
+    "search": {
+        "timeout": float(os.getenv("SEARCH_TIMEOUT", "60")),
+        "max_retries": int(os.getenv("SEARCH_MAX_RETRIES", "1")),
+    },
+    "upload": {
+        "timeout": float(os.getenv("UPLOAD_TIMEOUT", "300")),
+        "max_retries": int(os.getenv("UPLOAD_MAX_RETRIES", "3")),
+    },
+    "poll": {
+        "timeout": float(os.getenv("POLL_TIMEOUT", "10")),
+        "max_retries": int(os.getenv("POLL_MAX_RETRIES", "2")),
+    },
+}
+
+# Fallback: выполнять поиск через синхронный клиент в пуле потоков
+SEARCH_USE_THREADPOOL = os.getenv("SEARCH_USE_THREADPOOL", "false").lower() in ("1", "true", "yes")
+SEARCH_THREADPOOL_SIZE = int(os.getenv("SEARCH_THREADPOOL_SIZE", "16"))
+
+# Адаптивный опрос готовности Vector Store: быстрые первые опросы,
+# затем экспоненциальный рост интервала с джиттером до общего дедлайна
+POLL_INITIAL_INTERVAL = float(os.getenv("POLL_INITIAL_INTERVAL", "0.25"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "5"))
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "1.6"))
+POLL_DEADLINE = float(os.getenv("POLL_DEADLINE", "300"))
+
+# Реестр созданных Vector Stores (переживает перезапуски и общий для воркеров)
+STORE_REGISTRY_PATH = pathlib.Path(os.getenv(
+    "STORE_REGISTRY_PATH",
+    str(pathlib.Path(__file__).parent.parent / "data" / ".store_registry.json")
+))
+
+# Манифест загруженных файлов для дедупликации загрузок по содержимому
+FILE_MANIFEST_PATH = pathlib.Path(os.getenv(
+    "FILE_MANIFEST_PATH",
+    str(pathlib.Path(__file__).parent.parent / "data" / ".file_manifest.json")
+))
+
+# Именованные коллекции: Vector Store арендатора или корпуса для поиска по имени
+COLLECTIONS_PATH = pathlib.Path(os.getenv(
+    "COLLECTIONS_PATH",
+    str(pathlib.Path(__file__).parent.parent / "data" / ".collections.json")
+))
+
+# Лимит поисков на арендатора (ведро токенов, запросов/с; 0 - без лимита).
+# Встроенные режимы относятся к арендатору DEFAULT_TENANT, коллекции могут
+# переопределять лимит
+TENANT_RATE_LIMIT = float(os.getenv("TENANT_RATE_LIMIT", "0"))
+TENANT_BURST = float(os.getenv("TENANT_BURST", "20"))
+DEFAULT_TENANT = "default"
+
+# Очередь перед вызовами upstream: сколько поисков могут выполняться и ждать
+# одновременно, сверх этого запросы отклоняются с 429 (0 - без ограничения)
+UPSTREAM_MAX_PENDING = int(os.getenv("UPSTREAM_MAX_PENDING", "256"))
+
+# Пакетный поиск: максимум пар (запрос, режим) и одновременных поисков
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+
+# Параллелизм и число попыток при удалении индексов и файлов
+RESET_CONCURRENCY = int(os.getenv("RESET_CONCURRENCY", "16"))
+RESET_MAX_RETRIES = int(os.getenv("RESET_MAX_RETRIES", "3"))
+
+# Инкрементальная синхронизация режима chunks: число шардов JSONL файла и
+# задержка перед удалением старого индекса (для уже начатых поисков)
+CHUNKS_SHARD_COUNT = int(os.getenv("CHUNKS_SHARD_COUNT", str(DEFAULT_SHARD_COUNT)))
+SYNC_STRATEGIES = ["blue_green", "in_place"]
+SYNC_RETIRE_DELAY = float(os.getenv("SYNC_RETIRE_DELAY", "30"))
+
+# Сколько завершенных задач инициализации хранить для /api/initialize/{job_id}
+INIT_JOBS_HISTORY = 20
+
+# Просмотр файлов данных: строк (записей JSONL) на странице и порог кэша в памяти
+DATA_PAGE_LINES = int(os.getenv("DATA_PAGE_LINES", "200"))
+DATA_PAGE_MAX_LINES = 5000
+DATA_CACHE_MAX_BYTES = int(os.getenv("DATA_CACHE_MAX_BYTES", str(1024 * 1024)))
+
+# Кэш результатов поиска: memory, sqlite (общий для воркеров) или none
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory")
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_PATH = os.getenv(
+    "SEARCH_CACHE_PATH", os.path.join(tempfile.gettempdir(), "chunk_search_cache.sqlite3")
+)
+
+if YANDEX_BASE_URL == YANDEX_CLOUD_BASE_URL and (not YANDEX_API_KEY or not YANDEX_FOLDER_ID):
     raise ValueError("YANDEX_API_KEY и YANDEX_FOLDER_ID должны быть установлены в .env файле")
 
-# Инициализация синхронного клиента для Yandex Cloud (для поиска и удаления)
+# Локальному mock-серверу ключи не нужны
+YANDEX_API_KEY = YANDEX_API_KEY or "mock"
+YANDEX_FOLDER_ID = YANDEX_FOLDER_ID or "mock"
+
+if UPSTREAM_HTTP2 in ("1", "true", "yes") and not HTTP2_AVAILABLE:
+    print("UPSTREAM_HTTP2 включен, но пакет h2 не установлен - используется HTTP/1.1")
+UPSTREAM_HTTP2_ENABLED = HTTP2_AVAILABLE and UPSTREAM_HTTP2 in ("auto", "1", "true", "yes")
+
+upstream_limits = httpx.Limits(
+    max_connections=UPSTREAM_MAX_CONNECTIONS,
+    max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+    keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+)
+
+
+def upstream_timeout(seconds: float) -> httpx.Timeout:
+    """Таймаут запроса с общим ограничением на установку соединения"""
+    return httpx.Timeout(seconds, connect=UPSTREAM_CONNECT_TIMEOUT)
+
+
+def upstream_resource(url: httpx.URL) -> str:
+    """Ресурс API для меток метрик: responses, files, vector_stores"""
+    base_path = httpx.URL(YANDEX_BASE_URL).path.rstrip("/")
+    path = url.path[len(base_path):] if url.path.startswith(base_path) else url.path
+    return path.strip("/").split("/", 1)[0] or "unknown"
+
+
+def count_upstream_request(request: httpx.Request):
+    metrics.UPSTREAM_REQUESTS.inc(resource=upstream_resource(request.url))
+
+
+async def count_upstream_request_async(request: httpx.Request):
+    count_upstream_request(request)
+
+
+# Общие HTTP клиенты: соединения переиспользуются всеми операциями
+async_http_client = DefaultAsyncHttpxClient(
+    limits=upstream_limits,
+    timeout=upstream_timeout(UPSTREAM_TIMEOUT),
+    http2=UPSTREAM_HTTP2_ENABLED,
+    event_hooks={"request": [count_upstream_request_async]}
+)
+sync_http_client = DefaultHttpxClient(
+    limits=httpx.Limits(
+        max_connections=SEARCH_THREADPOOL_SIZE,
+        max_keepalive_connections=SEARCH_THREADPOOL_SIZE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+    ),
+    timeout=upstream_timeout(UPSTREAM_TIMEOUT),
+    http2=UPSTREAM_HTTP2_ENABLED,
+    event_hooks={"request": [count_upstream_request]}
+)
+
+# Инициализация синхронного клиента для Yandex Cloud (для fallback-поиска в пуле потоков)
 client = OpenAI(
     api_key=YANDEX_API_KEY,
-    base_url="https://ai.api.cloud.yandex.net/v1",
-    project=YANDEX_FOLDER_ID
+    base_url=YANDEX_BASE_URL,
+    project=YANDEX_FOLDER_ID,
+    http_client=sync_http_client,
+    timeout=upstream_timeout(UPSTREAM_POLICIES["search"]["timeout"]),
+    max_retries=UPSTREAM_POLICIES["search"]["max_retries"]
 )
 
-# Инициализация асинхронного клиента для Yandex Cloud (для загрузки и создания индексов)
+# Инициализация асинхронного клиента для Yandex Cloud (основной клиент для всех операций)
 async_client = AsyncOpenAI(
     api_key=YANDEX_API_KEY,
-    base_url="https://ai.api.cloud.yandex.net/v1",
-    project=YANDEX_FOLDER_ID
+    base_url=YANDEX_BASE_URL,
+    project=YANDEX_FOLDER_ID,
+    http_client=async_http_client
+)
+
+# Клиенты с политикой таймаутов и повторов для типа операции (общий пул соединений)
+search_client = async_client.with_options(
+    timeout=upstream_timeout(UPSTREAM_POLICIES["search"]["timeout"]),
+    max_retries=UPSTREAM_POLICIES["search"]["max_retries"]
+)
+upload_client = async_client.with_options(
+    timeout=upstream_timeout(UPSTREAM_POLICIES["upload"]["timeout"]),
+    max_retries=UPSTREAM_POLICIES["upload"]["max_retries"]
+)
+poll_client = async_client.with_options(
+    timeout=upstream_timeout(UPSTREAM_POLICIES["poll"]["timeout"]),
+    max_retries=UPSTREAM_POLICIES["poll"]["max_retries"]
+)
+
+# Семафоры ограничивают число одновременных запросов к каждому upstream
+upstream_semaphores = {
+    name: asyncio.Semaphore(limit) for name, limit in UPSTREAM_CONCURRENCY.items()
+}
+
+# Пул потоков для синхронных вызовов SDK (создается только при включенном fallback)
+search_executor = (
+    ThreadPoolExecutor(max_workers=SEARCH_THREADPOOL_SIZE, thread_name_prefix="search")
+    if SEARCH_USE_THREADPOOL
+    else None
+)
+
+# Кэш результатов поиска (None, если отключен)
+search_cache = create_search_cache(
+    SEARCH_CACHE_BACKEND, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_PATH
 )
 
+# Одинаковые одновременные поиски выполняют один запрос к upstream
+search_flights = SingleFlight()
+
+# Создание и обновление индекса режима выполняется под блокировкой режима,
+# чтобы параллельные инициализации не создавали дубликаты индексов
+store_locks = {"auto": asyncio.Lock(), "chunks": asyncio.Lock()}
+
+# Небольшие файлы данных в памяти (инвалидация по mtime)
+data_file_cache = DataFileCache(DATA_CACHE_MAX_BYTES)
+
+# Инструкции для модели при поиске
+SEARCH_INSTRUCTIONS = """Ты — умный ассистент для работы с базой знаний.
+
+ВАЖНО: Отвечай ТОЛЬКО на основе информации из подключенного поискового индекса.
+
+Правила:
+1. Используй ТОЛЬКО информацию из найденных фрагментов документов
+2. Если информации нет в индексе - четко скажи: "В базе знаний нет информации по этому вопросу"
+3. НЕ придумывай информацию и НЕ используй общие знания
+4. Давай точные ответы на основе найденных фрагментов
+5. Если ответ неполный - укажи это"""
+
+# Реестр Vector Stores и манифест загруженных файлов
+store_registry = StoreRegistry(STORE_REGISTRY_PATH)
+file_manifest = FileManifest(FILE_MANIFEST_PATH)
+collection_registry = CollectionRegistry(COLLECTIONS_PATH)
+
+# Защита от перегрузки: лимиты арендаторов и ограниченная очередь к upstream
+tenant_limiter = RateLimiter(TENANT_RATE_LIMIT, TENANT_BURST)
+upstream_admission = AdmissionQueue(UPSTREAM_MAX_PENDING)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """При старте восстанавливаем Vector Stores из реестра, при остановке закрываем пулы соединений"""
+    await restore_vector_stores()
+    yield
+    await async_http_client.aclose()
+    sync_http_client.close()
+
+
 # FastAPI приложение
 app = FastAPI(
     title="AI Search Demo",
     description="Демонстрация пользовательских чанков в Yandex Cloud AI Studio",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+def route_path(request: Request) -> str:
+    """Шаблон пути маршрута (/api/initialize/{job_id}) для меток метрик"""
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def collect_http_metrics(request: Request, call_next):
+    """Счетчик и длительность HTTP запросов по маршрутам"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        path = route_path(request)
+        metrics.HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, path=path)
+
+
 # CORS для локальной разработки
 app.add_middleware(
     CORSMiddleware,
@@ -66,22 +375,112 @@ vector_stores = {
     "chunks": None  # Для пользовательских чанков
 }
 
+# Версия активного индекса режима (ID и хэш данных), известная этому воркеру
+active_store_versions: dict[str, Optional[tuple[str, str]]] = {"auto": None, "chunks": None}
+
 # Pydantic модели
 class InitializeRequest(BaseModel):
     max_chunk_size_tokens: int = 800  # Максимальный размер чанка в токенах
     chunk_overlap_tokens: int = 400  # Перекрытие чанков в токенах
 
+class CollectionRequest(BaseModel):
+    store_id: str
+    tenant: Optional[str] = None  # По умолчанию - имя коллекции
+    rate_limit: Optional[float] = None  # Запросов/с (по умолчанию TENANT_RATE_LIMIT)
+    burst: Optional[float] = None  # Запас на всплески (по умолчанию TENANT_BURST)
+
+class SyncRequest(BaseModel):
+    strategy: str = "blue_green"  # blue_green (новый индекс и переключение) или in_place
+
+# Колбэк прогресса: progress(stage, **details)
+ProgressCallback = Callable[..., None]
+
+
+class InitJob:
+    """Фоновая задача создания индексов
+
+    Хранит историю событий прогресса, чтобы клиенты могли опрашивать
+    статус или подписаться на SSE и получить все события с начала.
+    """
+
+    def __init__(self, max_chunk_size_tokens: int, chunk_overlap_tokens: int):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"  # pending, running, completed, failed
+        self.params = {
+            "max_chunk_size_tokens": max_chunk_size_tokens,
+            "chunk_overlap_tokens": chunk_overlap_tokens
+        }
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: list[dict] = []
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def emit(self, mode: str, stage: str, **details):
+        """Добавить событие прогресса и разбудить подписчиков"""
+        self.events.append({"mode": mode, "stage": stage, "time": time.time(), **details})
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def progress(self, mode: str) -> ProgressCallback:
+        """Колбэк прогресса для создания индекса указанного режима"""
+        return lambda stage, **details: self.emit(mode, stage, **details)
+
+    async def wait_for_update(self, timeout: float):
+        """Дождаться нового события (или таймаута для heartbeat)"""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "events": self.events,
+            "result": self.result,
+            "error": self.error
+        }
+
+
 class SearchRequest(BaseModel):
     query: str
-    mode: str  # "auto" или "chunks"
+    mode: Optional[str] = None  # "auto", "chunks" или "local"
+    collection: Optional[str] = None  # Именованная коллекция вместо mode
     max_num_results: int = 3  # Максимальное количество результатов (по умолчанию 3)
+    retrieval_only: bool = False  # Только найденные чанки, без генерации ответа
+    include_raw: bool = False  # Вернуть полный ответ API в raw_response
+    chunk_fields: Optional[list[str]] = None  # Поля чанков в ответе (по умолчанию все)
+    max_chunk_chars: Optional[int] = None  # Обрезать текст чанков до N символов
+
+class BatchSearchRequest(BaseModel):
+    queries: list[str]
+    modes: list[str] = ["auto", "chunks"]  # Каждый запрос выполняется в каждом режиме
+    max_num_results: int = 3
+    retrieval_only: bool = False
+    concurrency: int = 8  # Число одновременных поисков (не более BATCH_MAX_CONCURRENCY)
+    chunk_fields: Optional[list[str]] = None
+    max_chunk_chars: Optional[int] = None
 
 class SearchResponse(BaseModel):
     answer: str
     chunks: list
-    mode: str
+    mode: str  # Режим или "collection"
     store_id: str
-    raw_response: dict
+    collection: Optional[str] = None
+    usage: Optional[dict] = None  # Токены запроса и ответа
+    raw_response: Optional[dict] = None  # Только при include_raw
+    cached: bool = False  # Результат получен из кэша
+    timings: dict = {}  # Длительность этапов обработки, мс
 
 
 def get_data_path(filename: str) -> pathlib.Path:
@@ -89,58 +488,266 @@ def get_data_path(filename: str) -> pathlib.Path:
     return pathlib.Path(__file__).parent.parent / "data" / filename
 
 
-async def upload_file(filename: str, content_type: str, extra_body: Optional[dict] = None) -> str:
-    """Асинхронно загрузить файл в Yandex Cloud AI Studio"""
-    file_path = get_data_path(filename)
+def get_mode_file(mode: str) -> str:
+    """Файл данных для режима"""
+    return AUTO_MODE_FILE if mode == "auto" else CHUNKS_MODE_FILE
+
+
+async def store_config(mode: str, params: dict) -> tuple[str, str, dict]:
+    """Ключ конфигурации индекса для режима
+
+    Параметры чанкования учитываются только в режиме auto: в режиме chunks
+    разбиение задано самим файлом. Хэш файла считается в пуле потоков.
     
-    if not file_path.exists():
-        raise FileNotFoundError(f"Файл {filename} не найден в директории data/")
+    Returns:
+        Кортеж (ключ конфигурации, хэш файла данных, параметры индекса)
+    """
+    mode_params = dict(params) if mode == "auto" else {"format": "chunks"}
+    data_hash = await asyncio.to_thread(hash_file, get_data_path(get_mode_file(mode)))
+    return config_key(mode, data_hash, mode_params), data_hash, mode_params
+
+
+async def verify_store(store_id: str) -> bool:
+    """Проверить, что Vector Store существует и проиндексирован
+
+    Удаленные на стороне облака индексы убираются из реестра.
+    """
+    try:
+        async with upstream_semaphores["vector_stores"]:
+            store = await poll_client.vector_stores.retrieve(store_id)
+    except NotFoundError:
+        print(f"Vector Store {store_id} не найден, удаляем из реестра")
+        await asyncio.to_thread(store_registry.remove, store_id)
+        return False
+    except Exception as e:
+        print(f"Не удалось проверить Vector Store {store_id}: {e}")
+        return False
+    return store.status == "completed"
+
+
+async def restore_vector_stores():
+    """Восстановить активные Vector Stores из реестра после перезапуска"""
+    for mode in ("auto", "chunks"):
+        entry = await asyncio.to_thread(store_registry.active, mode)
+        if not entry:
+            continue
+        # Индекс из реестра известен воркеру, даже если не используется
+        active_store_versions[mode] = (entry["store_id"], entry["data_hash"])
+        
+        file_path = get_data_path(get_mode_file(mode))
+        if not file_path.exists() or await asyncio.to_thread(hash_file, file_path) != entry["data_hash"]:
+            print(f"Данные режима '{mode}' изменились, индекс {entry['store_id']} не используется")
+            continue
+        
+        if await verify_store(entry["store_id"]):
+            vector_stores[mode] = entry["store_id"]
+            print(f"Восстановлен Vector Store режима '{mode}': {entry['store_id']}")
+
+
+def local_index_version() -> str:
+    """Версия файла локального индекса (mtime и размер)"""
+    try:
+        stat = get_data_path(CHUNKS_MODE_FILE).stat()
+    except FileNotFoundError:
+        return "missing"
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def search_key(
+    query: str,
+    mode: str,
+    store_id: str,
+    max_num_results: int,
+    retrieval_only: bool = False,
+    include_raw: bool = False
+) -> str:
+    """Ключ поиска: одинаковые ключи дают одинаковый результат"""
+    if store_id == LOCAL_STORE_ID:
+        # Локальный индекс перестраивается при изменении файла, поэтому
+        # результаты по прежней версии файла не должны находиться по ключу
+        store_id = f"{store_id}@{local_index_version()}"
+    # Результат без генерации не зависит от модели
+    model = "retrieval-only" if retrieval_only else YANDEX_CLOUD_MODEL
+    # Результаты с полным ответом API хранятся отдельно от компактных
+    if include_raw:
+        model += "+raw"
+    return SearchCache.make_key(query, mode, store_id, max_num_results, model)
+
+
+def search_cache_key(
+    query: str,
+    mode: str,
+    store_id: str,
+    max_num_results: int,
+    retrieval_only: bool = False,
+    include_raw: bool = False
+) -> Optional[str]:
+    """Ключ кэша поиска или None, если кэш отключен"""
+    if search_cache is None:
+        return None
+    return search_key(query, mode, store_id, max_num_results, retrieval_only, include_raw)
+
+
+async def invalidate_search_cache(reason: str):
+    """Сбросить кэш поиска после изменения Vector Stores"""
+    if search_cache is not None:
+        await search_cache.aclear()
+        print(f"Кэш поиска сброшен: {reason}")
+
+
+async def find_uploaded_file(key: str) -> Optional[str]:
+    """Найти ранее загруженный файл с тем же содержимым
+
+    ID из манифеста проверяется через files.retrieve: удаленные в облаке
+    файлы забываются, и загрузка выполняется заново.
+    """
+    entry = await asyncio.to_thread(file_manifest.get, key)
+    if not entry:
+        return None
+    
+    try:
+        async with upstream_semaphores["files"]:
+            remote = await poll_client.files.retrieve(entry["file_id"])
+    except NotFoundError:
+        await asyncio.to_thread(file_manifest.remove, entry["file_id"])
+        return None
+    except Exception as e:
+        print(f"Не удалось проверить файл {entry['file_id']}: {e}")
+        return None
+    
+    if remote.bytes is not None and remote.bytes != entry["bytes"]:
+        await asyncio.to_thread(file_manifest.remove, entry["file_id"])
+        return None
+    return remote.id
+
+
+async def upload_path(
+    file_path: pathlib.Path,
+    content_type: str,
+    extra_body: Optional[dict] = None
+) -> str:
+    """Асинхронно загрузить файл в Yandex Cloud AI Studio с дедупликацией
+
+    Если файл с таким же содержимым (и параметрами загрузки) уже загружен,
+    возвращается существующий ID без повторной загрузки.
+    """
+    filename = file_path.name
+    data_hash = await asyncio.to_thread(hash_file, file_path)
+    key = FileManifest.content_key(data_hash, "assistants", extra_body)
+    
+    existing_id = await find_uploaded_file(key)
+    if existing_id:
+        print(f"Файл {filename} не изменился, используем загруженный ID: {existing_id}")
+        return existing_id
     
     print(f"Загружаем файл {filename}...")
     
     # Используем асинхронный клиент
-    with open(file_path, "rb") as f:
-        file_response = await async_client.files.create(
-            file=(filename, f, content_type),
-            purpose="assistants",
-            extra_body=extra_body
-        )
+    async with upstream_semaphores["files"]:
+        with open(file_path, "rb") as f, metrics.stage("upload"):
+            file_response = await upload_client.files.create(
+                file=(filename, f, content_type),
+                purpose="assistants",
+                extra_body=extra_body
+            )
     
+    await asyncio.to_thread(file_manifest.add, key, file_response.id, filename, file_path.stat().st_size)
     print(f"Файл {filename} загружен с ID: {file_response.id}")
     return file_response.id
 
 
-async def wait_for_vector_store(store_id: str, name: str) -> str:
+async def upload_file(filename: str, content_type: str, extra_body: Optional[dict] = None) -> str:
+    """Асинхронно загрузить файл из директории data/ в Yandex Cloud AI Studio"""
+    file_path = get_data_path(filename)
+    
+    if not file_path.exists():
+        raise FileNotFoundError(f"Файл {filename} не найден в директории data/")
+    
+    return await upload_path(file_path, content_type, extra_body)
+
+
+def next_poll_delay(interval: float) -> float:
+    """Задержка до следующего опроса: интервал с джиттером в диапазоне [interval/2, interval]"""
+    return random.uniform(interval / 2, interval)
+
+
+async def wait_for_vector_store(
+    store_id: str,
+    name: str,
+    progress: Optional[ProgressCallback] = None
+) -> str:
     """Асинхронное ожидание готовности Vector Store
     
+    Первые опросы выполняются часто (POLL_INITIAL_INTERVAL), затем интервал
+    растет в POLL_BACKOFF раз до POLL_MAX_INTERVAL. Джиттер разносит опросы
+    параллельно создаваемых индексов. Общее время ожидания ограничено POLL_DEADLINE.
+    
     Args:
         store_id: ID Vector Store
         name: Название для логирования
+        progress: Колбэк прогресса (вызывается после каждого опроса)
     
     Returns:
         store_id если индекс готов
     """
     print(f"Ожидаем готовности индекса '{name}'...")
-    max_attempts = 60  # 2 минуты максимум
+    started = time.monotonic()
+    deadline = started + POLL_DEADLINE
+    interval = POLL_INITIAL_INTERVAL
     attempt = 0
     
-    while attempt < max_attempts:
-        store = await async_client.vector_stores.retrieve(store_id)
+    while True:
+        async with upstream_semaphores["vector_stores"]:
+            with metrics.stage("poll"):
+                store = await poll_client.vector_stores.retrieve(store_id)
         status = store.status
+        attempt += 1
+        
+        if progress:
+            file_counts = store.file_counts.model_dump() if getattr(store, "file_counts", None) else None
+            progress("polling", status=status, attempt=attempt, file_counts=file_counts)
         
         if status == "completed":
-            print(f"Vector Store '{name}' готов!")
+            elapsed = time.monotonic() - started
+            metrics.STAGE_SECONDS.observe(elapsed, stage="index")
+            print(f"Vector Store '{name}' готов! ({attempt} опросов, {elapsed:.1f} с)")
             return store_id
         elif status == "failed":
             raise Exception(f"Ошибка при создании индекса '{name}'")
         
-        await asyncio.sleep(2)
-        attempt += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        
+        await asyncio.sleep(min(next_poll_delay(interval), remaining))
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
     
     raise TimeoutError(f"Превышено время ожидания готовности индекса '{name}'")
 
 
-async def create_auto_chunking_store(max_chunk_size_tokens: int = 800, chunk_overlap_tokens: int = 400) -> str:
+async def wait_for_file_batch(store_id: str, batch_id: str):
+    """Дождаться завершения file batch с адаптивным интервалом опроса"""
+    interval = POLL_INITIAL_INTERVAL
+    deadline = time.monotonic() + POLL_DEADLINE
+    while True:
+        async with upstream_semaphores["vector_stores"]:
+            with metrics.stage("poll"):
+                batch = await poll_client.vector_stores.file_batches.retrieve(
+                    batch_id, vector_store_id=store_id
+                )
+        if batch.status != "in_progress":
+            return batch
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Превышено время ожидания file batch {batch_id}")
+        await asyncio.sleep(next_poll_delay(interval))
+        interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+
+
+async def create_auto_chunking_store(
+    max_chunk_size_tokens: int = 800,
+    chunk_overlap_tokens: int = 400,
+    progress: Optional[ProgressCallback] = None
+) -> str:
     """Асинхронно создать Vector Store с автоматическим чанкованием
     
     Загружает текстовый файл и создает индекс с автоматическим разбиением на чанки.
@@ -148,6 +755,7 @@ async def create_auto_chunking_store(max_chunk_size_tokens: int = 800, chunk_ove
     Args:
         max_chunk_size_tokens: Максимальный размер чанка в токенах (по умолчанию 800)
         chunk_overlap_tokens: Перекрытие чанков в токенах (по умолчанию 400)
+        progress: Колбэк прогресса
     
     Returns:
         ID созданного Vector Store
@@ -158,7 +766,10 @@ async def create_auto_chunking_store(max_chunk_size_tokens: int = 800, chunk_ove
     print(f"  chunk_overlap_tokens: {chunk_overlap_tokens}")
     print("-"*50)
     
+    progress = progress or (lambda stage, **details: None)
+    
     # Загружаем текстовый файл
+    progress("uploading", filename=AUTO_MODE_FILE)
     file_id = await upload_file(AUTO_MODE_FILE, "text/plain")
     
     # Создаем Vector Store с автоматическим чанкованием
@@ -180,17 +791,36 @@ async def create_auto_chunking_store(max_chunk_size_tokens: int = 800, chunk_ove
     print(f"Vector Store создан с ID: {store_id}")
     
     # Ожидаем готовности
-    await wait_for_vector_store(store_id, "FAQ Auto Chunking for Demo chunk_search")
+    progress("indexing", store_id=store_id)
+    await wait_for_vector_store(store_id, "FAQ Auto Chunking for Demo chunk_search", progress)
     
     return store_id
 
 
-async def create_custom_chunks_store() -> str:
+async def validate_chunks_file(file_path: pathlib.Path):
+    """Проверить JSONL файл с чанками, не блокируя event loop
+
+    Raises:
+        ValueError: если в файле есть некорректные строки
+    """
+    def collect_errors() -> list:
+        return list(itertools.islice(validate_jsonl(file_path, CHUNKS_MAX_TOKENS), 5))
+    
+    errors = await asyncio.to_thread(collect_errors)
+    if errors:
+        details = "; ".join(f"строка {line_no}: {error}" for line_no, error in errors)
+        raise ValueError(f"Файл {file_path.name} не прошел проверку: {details}")
+
+
+async def create_custom_chunks_store(progress: Optional[ProgressCallback] = None) -> str:
     """Асинхронно создать Vector Store с пользовательскими чанками
     
     Загружает JSONL файл с готовыми чанками (format="chunks").
     Каждая строка JSONL содержит готовый чанк с метаданными.
     
+    Args:
+        progress: Колбэк прогресса
+    
     Returns:
         ID созданного Vector Store
     """
@@ -198,7 +828,14 @@ async def create_custom_chunks_store() -> str:
     print("Режим B: Пользовательские чанки")
     print("-"*50)
     
+    progress = progress or (lambda stage, **details: None)
+    
+    # Проверяем формат и размер чанков до загрузки
+    progress("validating", filename=CHUNKS_MODE_FILE)
+    await validate_chunks_file(get_data_path(CHUNKS_MODE_FILE))
+    
     # Загружаем JSONL файл с чанками
+    progress("uploading", filename=CHUNKS_MODE_FILE)
     file_id = await upload_file(
         CHUNKS_MODE_FILE,
         "application/jsonlines",
@@ -218,79 +855,167 @@ async def create_custom_chunks_store() -> str:
     print(f"Vector Store создан с ID: {store_id}")
     
     # Ожидаем готовности
-    await wait_for_vector_store(store_id, "FAQ Custom Chunks for Demo chunk_search")
+    progress("indexing", store_id=store_id)
+    await wait_for_vector_store(store_id, "FAQ Custom Chunks for Demo chunk_search", progress)
     
     return store_id
 
 
-def search_in_store(query: str, store_id: str, max_num_results: int = 3) -> dict:
-    """Выполнить поиск в Vector Store
+async def create_response(**kwargs):
+    """Вызвать Responses API с ограничением параллелизма
+
+    По умолчанию используется асинхронный клиент. Если включен
+    SEARCH_USE_THREADPOOL, синхронный клиент вызывается в пуле потоков,
+    чтобы не блокировать event loop.
+    """
+    async with upstream_semaphores["responses"]:
+        if search_executor is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                search_executor, functools.partial(client.responses.create, **kwargs)
+            )
+        return await search_client.responses.create(**kwargs)
+
+
+def usage_dict(response) -> Optional[dict]:
+    """Usage ответа API без сериализации всего ответа"""
+    usage = getattr(response, "usage", None)
+    return usage.model_dump() if usage is not None else None
+
+
+def extract_chunks(item) -> list:
+    """Преобразовать результаты file_search_call в список чанков"""
+    chunks = []
+    if hasattr(item, 'results') and item.results:
+        for result in item.results:
+            chunks.append({
+                "text": result.text if hasattr(result, 'text') else "",
+                "score": result.score if hasattr(result, 'score') else 0.0,
+                "file_id": result.file_id if hasattr(result, 'file_id') else "",
+                "filename": result.filename if hasattr(result, 'filename') else ""
+            })
+    return chunks
+
+
+def parse_search_output(response) -> tuple[str, list]:
+    """Извлечь текст ответа и найденные чанки из ответа Responses API
+
+    Returns:
+        Кортеж (answer, chunks)
+    """
+    answer = ""
+    chunks = []
+    
+    if hasattr(response, 'output') and response.output:
+        for item in response.output:
+            # Извлекаем результаты поиска
+            if hasattr(item, 'type') and item.type == "file_search_call":
+                chunks.extend(extract_chunks(item))
+            
+            # Извлекаем текст ответа из message
+            elif hasattr(item, 'type') and item.type == "message":
+                if hasattr(item, 'content') and item.content:
+                    for content_item in item.content:
+                        if hasattr(content_item, 'type') and content_item.type == "output_text":
+                            if hasattr(content_item, 'text'):
+                                answer = content_item.text
+                                break
+    
+    return answer, chunks
+
+
+def build_search_params(query: str, store_id: str, max_num_results: int) -> dict:
+    """Параметры запроса к Responses API для поиска с file_search"""
+    return {
+        "model": f"gpt://{YANDEX_FOLDER_ID}/{YANDEX_CLOUD_MODEL}",
+        "instructions": SEARCH_INSTRUCTIONS,
+        "tools": [{
+            "type": "file_search",
+            "vector_store_ids": [store_id],
+            "max_num_results": max_num_results
+        }],
+        "input": query
+    }
+
+
+def build_local_params(query: str, chunks: list) -> dict:
+    """Параметры запроса к Responses API с найденными локально фрагментами в контексте"""
+    context = "\n\n".join(f"[{i}] {chunk['text']}" for i, chunk in enumerate(chunks, 1))
+    return {
+        "model": f"gpt://{YANDEX_FOLDER_ID}/{YANDEX_CLOUD_MODEL}",
+        "instructions": SEARCH_INSTRUCTIONS,
+        "input": f"Найденные фрагменты документов:\n\n{context}\n\nВопрос: {query}"
+    }
+
+
+def prepare_search(
+    query: str,
+    store_id: str,
+    max_num_results: int,
+    timings: Optional[metrics.Timings] = None
+) -> tuple[dict, Optional[list]]:
+    """Подготовить запрос к Responses API
+
+    Для локального режима поиск выполняется сразу по локальному индексу,
+    а найденные фрагменты передаются модели в контексте.
+    
+    Returns:
+        Кортеж (параметры Responses API, локально найденные чанки или None)
+    """
+    if store_id != LOCAL_STORE_ID:
+        return build_search_params(query, store_id, max_num_results), None
+    
+    timings = timings or metrics.Timings()
+    with timings.stage("retrieval"):
+        index = load_local_index(get_data_path(CHUNKS_MODE_FILE))
+        if index is None:
+            raise FileNotFoundError(f"Файл {CHUNKS_MODE_FILE} не найден в директории data/")
+        chunks = index.search(query, max_num_results, LOCAL_RETRIEVAL_METHOD)
+    return build_local_params(query, chunks), chunks
+
+
+async def search_in_store(
+    query: str,
+    store_id: str,
+    max_num_results: int = 3,
+    include_raw: bool = False
+) -> dict:
+    """Асинхронно выполнить поиск в Vector Store
     
     Args:
         query: Поисковый запрос
         store_id: ID Vector Store
         max_num_results: Максимальное количество результатов (по умолчанию 3)
+        include_raw: Сериализовать полный ответ API в raw_response
     """
     print(f"Выполняем поиск: '{query}' (max_results={max_num_results})")
     
-    model_uri = f"gpt://{YANDEX_FOLDER_ID}/{YANDEX_CLOUD_MODEL}"
-    
+    timings = metrics.Timings()
     try:
-        response = client.responses.create(
-            model=model_uri,
-            instructions="""Ты — умный ассистент для работы с базой знаний.
-
-ВАЖНО: Отвечай ТОЛЬКО на основе информации из подключенного поискового индекса.
-
-Правила:
-1. Используй ТОЛЬКО информацию из найденных фрагментов документов
-2. Если информации нет в индексе - четко скажи: "В базе знаний нет информации по этому вопросу"
-3. НЕ придумывай информацию и НЕ используй общие знания
-4. Давай точные ответы на основе найденных фрагментов
-5. Если ответ неполный - укажи это""",
-            tools=[{
-                "type": "file_search",
-                "vector_store_ids": [store_id],
-                "max_num_results": max_num_results
-            }],
-            input=query
-        )
+        params, local_chunks = prepare_search(query, store_id, max_num_results, timings)
+        # Один вызов Responses API: file_search и генерация ответа вместе
+        with timings.stage("responses"):
+            response = await create_response(**params)
         
-        # Сохраняем сырой ответ
-        raw_response = response.model_dump()
+        # Полный ответ сериализуется только по запросу: model_dump дорог под нагрузкой
+        with timings.stage("serialization"):
+            raw_response = response.model_dump() if include_raw else None
+            usage = usage_dict(response)
         
         # Извлекаем ответ и чанки из структуры response
-        answer = ""
-        chunks = []
-        
-        if hasattr(response, 'output') and response.output:
-            for item in response.output:
-                # Извлекаем результаты поиска
-                if hasattr(item, 'type') and item.type == "file_search_call":
-                    if hasattr(item, 'results') and item.results:
-                        for result in item.results:
-                            chunks.append({
-                                "text": result.text if hasattr(result, 'text') else "",
-                                "score": result.score if hasattr(result, 'score') else 0.0,
-                                "file_id": result.file_id if hasattr(result, 'file_id') else "",
-                                "filename": result.filename if hasattr(result, 'filename') else ""
-                            })
-                
-                # Извлекаем текст ответа из message
-                elif hasattr(item, 'type') and item.type == "message":
-                    if hasattr(item, 'content') and item.content:
-                        for content_item in item.content:
-                            if hasattr(content_item, 'type') and content_item.type == "output_text":
-                                if hasattr(content_item, 'text'):
-                                    answer = content_item.text
-                                    break
+        with timings.stage("parse"):
+            answer, chunks = parse_search_output(response)
+        if local_chunks is not None:
+            chunks = local_chunks
         
         print(f"Найдено {len(chunks)} фрагментов")
         
         return {
             "answer": answer,
             "chunks": chunks,
-            "raw_response": raw_response
+            "usage": usage,
+            "raw_response": raw_response,
+            "timings": timings.to_dict()
         }
     except Exception as e:
         print(f"Ошибка при поиске: {e}")
@@ -299,196 +1024,675 @@ def search_in_store(query: str, store_id: str, max_num_results: int = 3) -> dict
         raise
 
 
-@app.post("/api/initialize")
-async def initialize_stores(request: InitializeRequest = None):
-    """Инициализация Vector Stores - параллельное создание индексов для обоих режимов
+async def retrieve_chunks(
+    query: str,
+    store_id: str,
+    max_num_results: int = 3,
+    include_raw: bool = False
+) -> dict:
+    """Найти чанки без генерации ответа
+
+    Для Vector Store вызывается vector_stores.search напрямую, без Responses API
+    и модели; для локального режима используется локальный индекс.
     
-    Args:
-        request: Параметры инициализации (max_chunk_size_tokens, chunk_overlap_tokens)
+    Returns:
+        Результат в формате search_in_store с пустым answer
     """
-    # Используем значения по умолчанию, если request не передан
-    if request is None:
-        request = InitializeRequest()
-    
-    max_chunk_size_tokens = request.max_chunk_size_tokens
-    chunk_overlap_tokens = request.chunk_overlap_tokens
-    
-    print("\n" + "="*50)
-    print("Инициализация AI Search Demo (параллельно)")
-    print(f"  max_chunk_size_tokens: {max_chunk_size_tokens}")
-    print(f"  chunk_overlap_tokens: {chunk_overlap_tokens}")
-    print("="*50)
+    print(f"Выполняем поиск без генерации: '{query}' (max_results={max_num_results})")
     
-    try:
-        results = {
-            "auto": {"status": "skipped", "store_id": None},
-            "chunks": {"status": "skipped", "store_id": None}
-        }
-        
-        # Создаем список задач для параллельного выполнения
-        tasks = []
-        task_modes = []
-        
-        # Режим A: Автоматическое чанкование
-        if not vector_stores["auto"]:
-            tasks.append(create_auto_chunking_store(max_chunk_size_tokens, chunk_overlap_tokens))
-            task_modes.append("auto")
-        else:
-            print(f"\nРежим A уже существует: {vector_stores['auto']}")
-            results["auto"] = {"status": "already_exists", "store_id": vector_stores["auto"]}
-        
-        # Режим B: Пользовательские чанки
-        if not vector_stores["chunks"]:
-            tasks.append(create_custom_chunks_store())
-            task_modes.append("chunks")
-        else:
-            print(f"\nРежим B уже существует: {vector_stores['chunks']}")
-            results["chunks"] = {"status": "already_exists", "store_id": vector_stores["chunks"]}
-        
-        # Выполняем задачи параллельно
-        if tasks:
-            print(f"\nЗапускаем {len(tasks)} задач параллельно...\n")
-            store_ids = await asyncio.gather(*tasks)
-            
-            # Сохраняем результаты
-            for mode, store_id in zip(task_modes, store_ids):
-                vector_stores[mode] = store_id
-                results[mode] = {"status": "created", "store_id": store_id}
-        
-        print("\n" + "="*50)
-        print("Инициализация завершена успешно!")
-        print("="*50 + "\n")
-        
+    timings = metrics.Timings()
+    if store_id == LOCAL_STORE_ID:
+        _, chunks = prepare_search(query, store_id, max_num_results, timings)
         return {
-            "success": True,
-            "message": "Индексы успешно созданы",
-            "stores": results
+            "answer": "",
+            "chunks": chunks,
+            "usage": None,
+            "raw_response": {} if include_raw else None,
+            "timings": timings.to_dict()
         }
-        
-    except Exception as e:
-        print(f"\nОшибка при инициализации: {e}\n")
-        raise HTTPException(status_code=500, detail=f"Ошибка при инициализации: {str(e)}")
+    
+    async with upstream_semaphores["vector_stores"]:
+        with timings.stage("retrieval"):
+            page = await search_client.vector_stores.search(
+                store_id,
+                query=query,
+                max_num_results=max_num_results
+            )
+    
+    with timings.stage("parse"):
+        chunks = []
+        for result in page.data:
+            chunks.append({
+                "text": "\n".join(c.text for c in result.content if c.type == "text"),
+                "score": result.score,
+                "file_id": result.file_id,
+                "filename": result.filename
+            })
+    
+    raw_response = None
+    if include_raw:
+        with timings.stage("serialization"):
+            raw_response = page.model_dump()
+    
+    print(f"Найдено {len(chunks)} фрагментов")
+    return {
+        "answer": "",
+        "chunks": chunks,
+        "usage": None,
+        "raw_response": raw_response,
+        "timings": timings.to_dict()
+    }
 
 
-@app.get("/")
-async def root():
-    """Главная страница - отдаем frontend"""
-    frontend_path = pathlib.Path(__file__).parent.parent / "frontend" / "index.html"
-    if frontend_path.exists():
-        return FileResponse(frontend_path)
-    return {"message": "AI Search Demo API", "docs": "/docs"}
+def dump_json(data) -> str:
+    """Сериализовать в JSON через orjson (если установлен)"""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False)
 
 
-@app.get("/api/stores")
-async def get_stores():
-    """Получить ID Vector Stores"""
+def sse_event(event: str, data: dict) -> str:
+    """Сформировать событие Server-Sent Events"""
+    return f"event: {event}\ndata: {dump_json(data)}\n\n"
+
+
+CHUNK_FIELDS = ("text", "score", "file_id", "filename")
+
+
+def shape_chunks(
+    chunks: list,
+    fields: Optional[list[str]] = None,
+    max_chars: Optional[int] = None
+) -> list:
+    """Оставить в чанках только нужные поля и обрезать текст
+
+    Кэш хранит чанки целиком, форма ответа применяется к каждому запросу.
+    """
+    if fields is None and max_chars is None:
+        return chunks
+    keys = fields or CHUNK_FIELDS
+    shaped = []
+    for chunk in chunks:
+        item = {key: chunk[key] for key in keys if key in chunk}
+        if max_chars is not None and "text" in item and len(item["text"]) > max_chars:
+            item["text"] = item["text"][:max_chars]
+            item["truncated"] = True
+        shaped.append(item)
+    return shaped
+
+
+def validate_chunk_shape(fields: Optional[list[str]], max_chars: Optional[int]):
+    """Проверить параметры формы чанков или вернуть ошибку HTTP 400"""
+    if fields is not None:
+        unknown = [field for field in fields if field not in CHUNK_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестные поля чанков: {', '.join(unknown)}; доступны: {', '.join(CHUNK_FIELDS)}"
+            )
+    if max_chars is not None and max_chars < 1:
+        raise HTTPException(status_code=400, detail="max_chunk_chars должен быть положительным")
+
+
+async def stream_search_in_store(
+    query: str,
+    store_id: str,
+    max_num_results: int = 3,
+    cache_key: Optional[str] = None,
+    include_raw: bool = False,
+    chunk_fields: Optional[list[str]] = None,
+    max_chunk_chars: Optional[int] = None
+):
+    """Потоковый поиск в Vector Store через Responses streaming API
+
+    Отдает SSE-события по мере их появления:
+        chunks - результаты file_search_call (до начала генерации ответа)
+        delta  - очередной фрагмент текста ответа
+        done   - итоговый ответ, usage и полный ответ API (при include_raw)
+        error  - ошибка при поиске
+    
+    Если передан cache_key, итоговый результат сохраняется в кэш поиска.
+    chunk_fields и max_chunk_chars задают форму чанков в событиях (см. shape_chunks).
+    """
+    print(f"Выполняем потоковый поиск: '{query}' (max_results={max_num_results})")
+    
+    chunks_sent = False
+    started = time.perf_counter()
+    timings = metrics.Timings()
+    try:
+        params, local_chunks = prepare_search(query, store_id, max_num_results, timings)
+        if local_chunks is not None:
+            chunks_sent = True
+            yield sse_event("chunks", {"chunks": shape_chunks(local_chunks, chunk_fields, max_chunk_chars)})
+        
+        # Место в очереди к upstream занято до конца потока
+        with upstream_admission.admit():
+            async with upstream_semaphores["responses"]:
+                # retrieval - до результатов file_search, generation - от них до конца ответа
+                phase_started = time.perf_counter()
+                stream = await search_client.responses.create(**params, stream=True)
+                async for event in stream:
+                    if event.type == "response.output_item.done" and event.item.type == "file_search_call":
+                        timings.add("retrieval", time.perf_counter() - phase_started)
+                        phase_started = time.perf_counter()
+                        chunks = extract_chunks(event.item)
+                        if chunks:
+                            chunks_sent = True
+                            yield sse_event("chunks", {"chunks": shape_chunks(chunks, chunk_fields, max_chunk_chars)})
+                
+                    elif event.type == "response.output_text.delta":
+                        yield sse_event("delta", {"delta": event.delta})
+                
+                    elif event.type == "response.completed":
+                        timings.add("generation", time.perf_counter() - phase_started)
+                        with timings.stage("parse"):
+                            answer, chunks = parse_search_output(event.response)
+                        if local_chunks is not None:
+                            chunks = local_chunks
+                        # Если результаты поиска не пришли отдельным событием, отдаем их из итогового ответа
+                        if not chunks_sent:
+                            yield sse_event("chunks", {"chunks": shape_chunks(chunks, chunk_fields, max_chunk_chars)})
+                        print(f"Найдено {len(chunks)} фрагментов")
+                        with timings.stage("serialization"):
+                            raw_response = event.response.model_dump() if include_raw else None
+                            usage = usage_dict(event.response)
+                        result = {"answer": answer, "chunks": chunks, "usage": usage, "raw_response": raw_response}
+                        if cache_key:
+                            await search_cache.aset(cache_key, result, time.perf_counter() - started)
+                        yield sse_event("done", {
+                            "answer": answer,
+                            "usage": usage,
+                            **({"raw_response": raw_response} if include_raw else {}),
+                            "timings": timings.to_dict()
+                        })
+                
+                    elif event.type in ("response.failed", "error"):
+                        yield sse_event("error", {"detail": f"Ошибка при поиске: {event.type}"})
+    except Exception as e:
+        print(f"Ошибка при потоковом поиске: {e}")
+        yield sse_event("error", {"detail": f"Ошибка при поиске: {str(e)}"})
+
+
+async def replay_search_result(
+    result: dict,
+    cached: bool,
+    include_raw: bool = False,
+    chunk_fields: Optional[list[str]] = None,
+    max_chunk_chars: Optional[int] = None
+):
+    """Отдать готовый результат (из кэша или без генерации) в формате потокового поиска"""
+    yield sse_event("chunks", {"chunks": shape_chunks(result["chunks"], chunk_fields, max_chunk_chars)})
+    yield sse_event("done", {
+        "answer": result["answer"],
+        "usage": result.get("usage"),
+        **({"raw_response": result.get("raw_response")} if include_raw else {}),
+        "cached": cached,
+        "timings": result.get("timings", {})
+    })
+
+
+# Задачи инициализации по job_id
+init_jobs: dict[str, InitJob] = {}
+
+
+async def ensure_store(mode: str, job: InitJob) -> dict:
+    """Получить Vector Store режима: существующий, из реестра или новый
+
+    Выполняется под блокировкой режима: параллельная инициализация дождется
+    первой и получит созданный ею индекс вместо создания дубликата.
+
+    Returns:
+        Статус ("already_exists", "reused" или "created") и ID Vector Store
+    """
+    async with store_locks[mode]:
+        return await ensure_store_locked(mode, job)
+
+
+async def ensure_store_locked(mode: str, job: InitJob) -> dict:
+    """ensure_store без блокировки (вызывающий держит store_locks[mode])"""
+    title = "Режим A" if mode == "auto" else "Режим B"
+    
+    store_id = await adopt_active_store(mode)
+    if store_id:
+        print(f"\n{title} уже существует: {store_id}")
+        job.emit(mode, "ready", store_id=store_id)
+        return {"status": "already_exists", "store_id": store_id}
+    
+    # Индекс с той же конфигурацией мог быть создан ранее
+    key, data_hash, mode_params = await store_config(mode, job.params)
+    entry = await asyncio.to_thread(store_registry.get, key)
+    if entry and await verify_store(entry["store_id"]):
+        print(f"\n{title}: используем ранее созданный индекс {entry['store_id']}")
+        await asyncio.to_thread(store_registry.activate, mode, key)
+        vector_stores[mode] = entry["store_id"]
+        job.emit(mode, "ready", store_id=entry["store_id"], reused=True)
+        return {"status": "reused", "store_id": entry["store_id"]}
+    
+    if mode == "auto":
+        store_id = await create_auto_chunking_store(
+            job.params["max_chunk_size_tokens"],
+            job.params["chunk_overlap_tokens"],
+            job.progress(mode)
+        )
+    else:
+        store_id = await create_custom_chunks_store(job.progress(mode))
+    
+    await asyncio.to_thread(store_registry.register, key, mode, store_id, mode_params, data_hash)
+    vector_stores[mode] = store_id
+    job.emit(mode, "ready", store_id=store_id)
+    return {"status": "created", "store_id": store_id}
+
+
+async def run_initialization(job: InitJob) -> dict:
+    """Параллельное создание индексов для обоих режимов
+
+    Прогресс каждого режима публикуется в job.events.
+    
+    Returns:
+        Статус и ID Vector Store по режимам
+    """
+    print("\n" + "="*50)
+    print(f"Инициализация AI Search Demo (параллельно), задача {job.id}")
+    print(f"  max_chunk_size_tokens: {job.params['max_chunk_size_tokens']}")
+    print(f"  chunk_overlap_tokens: {job.params['chunk_overlap_tokens']}")
+    print("="*50)
+    
+    modes = ["auto", "chunks"]
+    results = dict(zip(modes, await asyncio.gather(*(ensure_store(mode, job) for mode in modes))))
+    
+    if any(r["status"] != "already_exists" for r in results.values()):
+        await invalidate_search_cache("изменились индексы")
+    
+    print("\n" + "="*50)
+    print("Инициализация завершена успешно!")
+    print("="*50 + "\n")
+    
+    return results
+
+
+async def run_init_job(job: InitJob):
+    """Выполнить задачу инициализации и сохранить результат в job"""
+    job.status = "running"
+    try:
+        job.result = await run_initialization(job)
+        job.status = "completed"
+    except Exception as e:
+        print(f"\nОшибка при инициализации: {e}\n")
+        job.error = str(e)
+        job.status = "failed"
+    finally:
+        job.finished_at = time.time()
+        job.emit("all", job.status)
+
+
+def start_init_job(max_chunk_size_tokens: int, chunk_overlap_tokens: int) -> InitJob:
+    """Запустить инициализацию в фоне и зарегистрировать задачу
+
+    Если задача с теми же параметрами уже выполняется, возвращается она.
+    """
+    job = InitJob(max_chunk_size_tokens, chunk_overlap_tokens)
+    running = next((j for j in init_jobs.values() if not j.done and j.params == job.params), None)
+    if running:
+        print(f"Инициализация с теми же параметрами уже выполняется: задача {running.id}")
+        return running
+    
+    init_jobs[job.id] = job
+    
+    # Удаляем самые старые завершенные задачи
+    finished = [j for j in init_jobs.values() if j.done]
+    for old in finished[:max(0, len(finished) - INIT_JOBS_HISTORY)]:
+        del init_jobs[old.id]
+    
+    job.task = asyncio.create_task(run_init_job(job))
+    return job
+
+
+def get_init_job(job_id: str) -> InitJob:
+    """Найти задачу инициализации или вернуть 404"""
+    job = init_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    return job
+
+
+@app.post("/api/initialize")
+async def initialize_stores(request: InitializeRequest = None, wait: bool = False):
+    """Инициализация Vector Stores - параллельное создание индексов для обоих режимов
+    
+    По умолчанию индексы создаются в фоне, а ответ сразу содержит job_id.
+    Прогресс доступен через /api/initialize/{job_id} и /api/initialize/{job_id}/events.
+    
+    Args:
+        request: Параметры инициализации (max_chunk_size_tokens, chunk_overlap_tokens)
+        wait: Дождаться завершения и вернуть результат (прежнее поведение)
+    """
+    # Используем значения по умолчанию, если request не передан
+    if request is None:
+        request = InitializeRequest()
+    
+    job = start_init_job(request.max_chunk_size_tokens, request.chunk_overlap_tokens)
+    
+    if not wait:
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "message": "Создание индексов запущено",
+            "job_id": job.id,
+            "status_url": f"/api/initialize/{job.id}",
+            "events_url": f"/api/initialize/{job.id}/events"
+        })
+    
+    await asyncio.shield(job.task)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Ошибка при инициализации: {job.error}")
+    
     return {
-        "auto": vector_stores["auto"],
-        "chunks": vector_stores["chunks"]
+        "success": True,
+        "message": "Индексы успешно созданы",
+        "job_id": job.id,
+        "stores": job.result
     }
 
 
-@app.get("/api/data/{mode}")
-async def get_data_file(mode: str):
-    """Получить содержимое файла данных для указанного режима"""
+@app.get("/api/initialize/{job_id}")
+async def get_initialize_status(job_id: str):
+    """Статус задачи инициализации"""
+    return get_init_job(job_id).to_dict()
+
+
+async def stream_init_job_events(job: InitJob):
+    """SSE-поток событий задачи инициализации
+
+    События:
+        progress  - этап создания индекса (uploading, indexing, polling, ready)
+        completed - индексы созданы, data содержит результат
+        failed    - ошибка, data содержит текст ошибки
+    """
+    sent = 0
+    while True:
+        while sent < len(job.events):
+            event = job.events[sent]
+            sent += 1
+            if event["mode"] != "all":
+                yield sse_event("progress", event)
+        
+        if job.done:
+            if job.status == "completed":
+                yield sse_event("completed", {"job_id": job.id, "stores": job.result})
+            else:
+                yield sse_event("failed", {"job_id": job.id, "detail": job.error})
+            return
+        
+        await job.wait_for_update(timeout=15)
+        if sent == len(job.events) and not job.done:
+            # Комментарий SSE удерживает соединение открытым
+            yield ": keep-alive\n\n"
+
+
+@app.get("/api/initialize/{job_id}/events")
+async def get_initialize_events(job_id: str):
+    """Подписка на прогресс задачи инициализации (SSE)"""
+    job = get_init_job(job_id)
+    return StreamingResponse(
+        stream_init_job_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/")
+async def root():
+    """Главная страница - отдаем frontend"""
+    frontend_path = pathlib.Path(__file__).parent.parent / "frontend" / "index.html"
+    if frontend_path.exists():
+        return FileResponse(frontend_path)
+    return {"message": "AI Search Demo API", "docs": "/docs"}
+
+
+@app.get("/api/stores")
+async def get_stores():
+    """Получить ID Vector Stores"""
+    return {
+        "auto": await adopt_active_store("auto"),
+        "chunks": await adopt_active_store("chunks")
+    }
+
+
+@app.get("/api/collections")
+async def get_collections():
+    """Именованные коллекции и их арендаторы"""
+    return {"collections": collection_registry.all()}
+
+
+@app.put("/api/collections/{name}")
+async def put_collection(name: str, request: CollectionRequest):
+    """Создать или обновить коллекцию: имя для поиска по существующему Vector Store
+
+    Vector Store должен существовать и быть проиндексирован (например,
+    созданный backend/ingest.py).
+    """
+    if not await verify_store(request.store_id):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Vector Store {request.store_id} не найден или еще не проиндексирован"
+        )
+    entry = await asyncio.to_thread(
+        collection_registry.put, name, request.store_id, request.tenant, request.rate_limit, request.burst
+    )
+    return {"name": name, **entry}
+
+
+@app.delete("/api/collections/{name}")
+async def delete_collection(name: str):
+    """Удалить коллекцию (сам Vector Store не удаляется)"""
+    if not await asyncio.to_thread(collection_registry.remove, name):
+        raise HTTPException(status_code=404, detail=f"Коллекция '{name}' не найдена")
+    return {"success": True}
+
+
+def get_data_file_path(mode: str) -> pathlib.Path:
+    """Файл данных режима или ошибка HTTP"""
     if mode not in ["auto", "chunks"]:
         raise HTTPException(status_code=400, detail="mode должен быть 'auto' или 'chunks'")
     
+    file_path = get_data_path(get_mode_file(mode))
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail=f"Файл не найден: {file_path.name}")
+    return file_path
+
+
+@app.get("/api/data/{mode}")
+async def get_data_file(
+    mode: str,
+    request: Request,
+    cursor: int = 0,
+    limit: int = DATA_PAGE_LINES
+):
+    """Получить страницу файла данных для указанного режима
+    
+    Страница содержит до limit строк (для JSONL - записей), начиная с
+    байтового смещения cursor. next_cursor - курсор следующей страницы
+    (null в конце файла). Поддерживаются условные запросы: ETag / If-None-Match
+    и Last-Modified / If-Modified-Since.
+    """
+    file_path = get_data_file_path(mode)
+    if cursor < 0:
+        raise HTTPException(status_code=400, detail="cursor должен быть неотрицательным")
+    if not 1 <= limit <= DATA_PAGE_MAX_LINES:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {DATA_PAGE_MAX_LINES}")
+    
+    stat = file_path.stat()
+    etag = make_etag(stat, cursor, limit)
+    headers = {"ETag": etag, "Last-Modified": last_modified(stat), "Cache-Control": "no-cache"}
+    if not_modified(request.headers, etag, stat):
+        return Response(status_code=304, headers=headers)
+    
     try:
-        if mode == "auto":
-            file_path = get_data_path(AUTO_MODE_FILE)
-        else:
-            file_path = get_data_path(CHUNKS_MODE_FILE)
-        
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail=f"Файл не найден: {file_path.name}")
-        
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        return {
+        content, lines, next_cursor = await asyncio.to_thread(
+            data_file_cache.read_page, file_path, stat, cursor, limit
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при чтении файла: {str(e)}")
+    
+    return FastJSONResponse(
+        {
             "mode": mode,
             "filename": file_path.name,
             "content": content,
-            "size": len(content)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при чтении файла: {str(e)}")
+            "size": stat.st_size,
+            "cursor": cursor,
+            "lines": lines,
+            "next_cursor": next_cursor
+        },
+        headers=headers
+    )
+
+
+@app.get("/api/data/{mode}/raw")
+async def get_data_file_raw(mode: str, request: Request):
+    """Файл данных целиком или по частям (HTTP Range), с ETag и Last-Modified"""
+    file_path = get_data_file_path(mode)
+    stat = file_path.stat()
+    etag = make_etag(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified(stat),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache"
+    }
+    if not_modified(request.headers, etag, stat):
+        return Response(status_code=304, headers=headers)
+    
+    # If-Range: диапазон действителен, только если файл не изменился
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != etag and if_range != headers["Last-Modified"]:
+        range_header = None
+    
+    try:
+        byte_range = parse_range(range_header, stat.st_size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{stat.st_size}"})
+    
+    if byte_range is None:
+        start, end, status_code = 0, stat.st_size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    media_type = "application/jsonl" if file_path.suffix == ".jsonl" else "text/plain; charset=utf-8"
+    return StreamingResponse(
+        iter_file_range(file_path, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+async def call_with_retry(description: str, fn, *args, **kwargs):
+    """Вызвать upstream с повторами и экспоненциальной задержкой
+
+    NotFoundError не повторяется: для удаления это означает, что объекта уже нет.
+    """
+    for attempt in range(1, RESET_MAX_RETRIES + 1):
+        try:
+            return await fn(*args, **kwargs)
+        except NotFoundError:
+            raise
+        except Exception as e:
+            if attempt == RESET_MAX_RETRIES:
+                raise
+            delay = next_poll_delay(0.5 * 2 ** attempt)
+            print(f"{description}: ошибка ({e}), повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+
+async def list_store_file_ids(store_id: str) -> list[str]:
+    """Все ID файлов Vector Store (с обходом всех страниц)"""
+    file_ids = []
+    async for file_obj in async_client.vector_stores.files.list(store_id, limit=100):
+        file_ids.append(file_obj.id)
+    return file_ids
 
 
 @app.post("/api/reset")
 async def reset_stores():
-    """Сбросить Vector Stores и удалить загруженные файлы"""
+    """Сбросить Vector Stores и удалить загруженные файлы
+
+    Списки файлов всех индексов запрашиваются параллельно, затем индексы и
+    файлы удаляются одновременно (не более RESET_CONCURRENCY запросов) с повторами.
+    """
     try:
         print("\n" + "="*50)
         print("Удаление индексов и файлов")
         print("="*50)
         
+        modes = ["auto", "chunks"]
+        store_ids = {mode: await adopt_active_store(mode) for mode in modes}
+        active_modes = [mode for mode in modes if store_ids[mode]]
+        
         deleted = {
-            "stores": {"auto": False, "chunks": False},
-            "files": {"auto": False, "chunks": False}
+            "stores": {mode: False for mode in modes},
+            "files": {mode: False for mode in modes}
         }
         
-        # Получить список файлов из Vector Stores перед удалением
-        files_to_delete = {"auto": [], "chunks": []}
-        
-        # Получить файлы из автоматического индекса
-        if vector_stores["auto"]:
-            try:
-                files_list = client.vector_stores.files.list(vector_stores["auto"])
-                if hasattr(files_list, 'data'):
-                    for file_obj in files_list.data:
-                        files_to_delete["auto"].append(file_obj.id)
-            except Exception as e:
-                print(f"Ошибка при получении файлов auto store: {e}")
+        # Получить списки файлов из Vector Stores перед удалением (параллельно)
+        files_to_delete = {mode: [] for mode in modes}
+        listings = await asyncio.gather(
+            *(
+                call_with_retry(f"Список файлов {mode} store", list_store_file_ids, store_ids[mode])
+                for mode in active_modes
+            ),
+            return_exceptions=True
+        )
+        for mode, listing in zip(active_modes, listings):
+            if isinstance(listing, Exception):
+                print(f"Ошибка при получении файлов {mode} store: {listing}")
+            else:
+                files_to_delete[mode] = listing
         
-        # Получить файлы из индекса с чанками
-        if vector_stores["chunks"]:
-            try:
-                files_list = client.vector_stores.files.list(vector_stores["chunks"])
-                if hasattr(files_list, 'data'):
-                    for file_obj in files_list.data:
-                        files_to_delete["chunks"].append(file_obj.id)
-            except Exception as e:
-                print(f"Ошибка при получении файлов chunks store: {e}")
+        limit = asyncio.Semaphore(RESET_CONCURRENCY)
         
-        # Удалить автоматический индекс
-        if vector_stores["auto"]:
+        async def delete_store(mode: str):
+            store_id = store_ids[mode]
             try:
-                client.vector_stores.delete(vector_stores["auto"])
-                deleted["stores"]["auto"] = True
-                print(f"Удален Vector Store: {vector_stores['auto']}")
+                async with limit:
+                    await call_with_retry(
+                        f"Удаление {store_id}", async_client.vector_stores.delete, store_id
+                    )
+                print(f"Удален Vector Store: {store_id}")
+            except NotFoundError:
+                print(f"Vector Store {store_id} уже удален")
             except Exception as e:
-                print(f"Ошибка при удалении auto store: {e}")
-            vector_stores["auto"] = None
+                print(f"Ошибка при удалении {mode} store: {e}")
+                return
+            await asyncio.to_thread(store_registry.remove, store_id)
+            deleted["stores"][mode] = True
         
-        # Удалить файлы для автоматического режима
-        for file_id in files_to_delete["auto"]:
+        async def delete_file(mode: str, file_id: str):
             try:
-                client.files.delete(file_id)
-                deleted["files"]["auto"] = True
+                async with limit:
+                    await call_with_retry(f"Удаление {file_id}", async_client.files.delete, file_id)
                 print(f"Удален файл: {file_id}")
+            except NotFoundError:
+                print(f"Файл {file_id} уже удален")
             except Exception as e:
                 print(f"Ошибка при удалении файла {file_id}: {e}")
+                return
+            await asyncio.to_thread(file_manifest.remove, file_id)
+            deleted["files"][mode] = True
         
-        # Удалить индекс с чанками
-        if vector_stores["chunks"]:
-            try:
-                client.vector_stores.delete(vector_stores["chunks"])
-                deleted["stores"]["chunks"] = True
-                print(f"Удален Vector Store: {vector_stores['chunks']}")
-            except Exception as e:
-                print(f"Ошибка при удалении chunks store: {e}")
-            vector_stores["chunks"] = None
+        # Удалить индексы и файлы параллельно
+        await asyncio.gather(
+            *(delete_store(mode) for mode in active_modes),
+            *(delete_file(mode, file_id) for mode in modes for file_id in files_to_delete[mode])
+        )
         
-        # Удалить файлы для режима с чанками
-        for file_id in files_to_delete["chunks"]:
-            try:
-                client.files.delete(file_id)
-                deleted["files"]["chunks"] = True
-                print(f"Удален файл: {file_id}")
-            except Exception as e:
-                print(f"Ошибка при удалении файла {file_id}: {e}")
+        for mode in active_modes:
+            vector_stores[mode] = None
+        
+        await invalidate_search_cache("индексы удалены")
         
         print(f"Удалено файлов: auto={len(files_to_delete['auto'])}, chunks={len(files_to_delete['chunks'])}")
         print("="*50 + "\n")
@@ -507,30 +1711,599 @@ async def reset_stores():
         raise HTTPException(status_code=500, detail=f"Ошибка при сбросе: {str(e)}")
 
 
-@app.post("/api/search", response_model=SearchResponse)
-async def search(request: SearchRequest):
-    """Выполнить поиск"""
-    if request.mode not in ["auto", "chunks"]:
-        raise HTTPException(status_code=400, detail="mode должен быть 'auto' или 'chunks'")
+# Одновременно выполняется только одна синхронизация режима chunks
+chunks_sync_lock = asyncio.Lock()
+
+# Отложенное удаление старых индексов (ссылки держат задачи от сборщика мусора)
+retire_tasks: set[asyncio.Task] = set()
+
+
+async def upload_shards(file_path: pathlib.Path, shards: dict[str, list[bytes]], names: list[str]) -> dict:
+    """Загрузить шарды параллельно (с дедупликацией по манифесту)
+
+    Returns:
+        Состояние загруженных шардов: {<шард>: {"hash", "file_id", "records"}}
+    """
+    with tempfile.TemporaryDirectory(prefix="chunks-shards-") as tmp:
+        directory = pathlib.Path(tmp)
+        paths = [write_shard(directory, file_path.stem, shard, shards[shard]) for shard in names]
+        file_ids = await asyncio.gather(*(
+            upload_path(path, "application/jsonlines", extra_body={"format": "chunks"})
+            for path in paths
+        ))
+    return {
+        shard: {"hash": shard_digest(shards[shard]), "file_id": file_id, "records": len(shards[shard])}
+        for shard, file_id in zip(names, file_ids)
+    }
+
+
+async def attach_shards(store_id: str, file_ids: list[str]):
+    """Подключить файлы шардов к Vector Store одним file batch и дождаться индексации"""
+    batch = await call_with_retry(
+        "Создание file batch",
+        async_client.vector_stores.file_batches.create,
+        vector_store_id=store_id,
+        file_ids=file_ids
+    )
+    with metrics.stage("index"):
+        batch = await wait_for_file_batch(store_id, batch.id)
+    if batch.status != "completed" or batch.file_counts.failed:
+        raise Exception(f"File batch {batch.id}: не проиндексировано файлов: {batch.file_counts.failed}")
+
+
+async def discard_files(file_ids: list[str], store_id: Optional[str] = None):
+    """Отключить файлы от Vector Store (если указан) и удалить их в облаке"""
+    async def discard(file_id: str):
+        try:
+            if store_id:
+                try:
+                    await call_with_retry(
+                        f"Отключение {file_id}",
+                        async_client.vector_stores.files.delete,
+                        file_id,
+                        vector_store_id=store_id
+                    )
+                except NotFoundError:
+                    pass
+            await call_with_retry(f"Удаление {file_id}", async_client.files.delete, file_id)
+        except NotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ошибка при удалении файла {file_id}: {e}")
+            return
+        await asyncio.to_thread(file_manifest.remove, file_id)
     
-    store_id = vector_stores[request.mode]
+    await asyncio.gather(*(discard(file_id) for file_id in file_ids))
+
+
+async def retire_store(store_id: str, keep_file_ids: set[str]):
+    """Удалить замененный индекс и его файлы, не используемые новым индексом
+
+    Удаление откладывается на SYNC_RETIRE_DELAY, чтобы поиски, уже
+    получившие ID старого индекса, успели завершиться.
+    """
+    await asyncio.sleep(SYNC_RETIRE_DELAY)
+    try:
+        file_ids = await call_with_retry(f"Список файлов {store_id}", list_store_file_ids, store_id)
+        await call_with_retry(f"Удаление {store_id}", async_client.vector_stores.delete, store_id)
+        print(f"Удален замененный Vector Store: {store_id}")
+    except NotFoundError:
+        file_ids = []
+    except Exception as e:
+        print(f"Ошибка при удалении замененного Vector Store {store_id}: {e}")
+        return
+    await asyncio.to_thread(store_registry.remove, store_id)
+    await discard_files([file_id for file_id in file_ids if file_id not in keep_file_ids])
+
+
+async def sync_chunks_store(strategy: str) -> dict:
+    """Инкрементально синхронизировать индекс режима chunks с JSONL файлом
+
+    Записи раскладываются по шардам (backend/shards.py), и загружаются только
+    шарды, хэш которых изменился с последней синхронизации.
+
+    Стратегии:
+        blue_green - новый индекс из неизменных и новых шардов; поиск идет
+                     по старому индексу до готовности нового, затем индекс
+                     переключается в реестре (другие воркеры подхватывают его
+                     на следующем поиске, см. adopt_active_store)
+        in_place   - изменения подключаются к текущему индексу, затем
+                     отключаются устаревшие шарды; индексируются только изменения
+
+    Returns:
+        Итог синхронизации: индекс, стратегия и число шардов по типам изменений
+    """
+    started = time.monotonic()
+    file_path = get_data_path(CHUNKS_MODE_FILE)
+    await validate_chunks_file(file_path)
+    key, data_hash, mode_params = await store_config("chunks", {})
+    
+    previous = await asyncio.to_thread(store_registry.active, "chunks")
+    if previous and not await verify_store(previous["store_id"]):
+        previous = None
+    if previous and previous["data_hash"] == data_hash:
+        vector_stores["chunks"] = previous["store_id"]
+        return {"status": "unchanged", "store_id": previous["store_id"]}
+    
+    old_files = previous_files((previous or {}).get("shards"), CHUNKS_SHARD_COUNT)
+    shards = await asyncio.to_thread(split_shards, file_path, CHUNKS_SHARD_COUNT)
+    plan = plan_sync(old_files, shards)
+    print(
+        f"Синхронизация chunks: добавлено {len(plan['added'])}, изменено {len(plan['changed'])}, "
+        f"удалено {len(plan['removed'])}, без изменений {len(plan['unchanged'])} шардов"
+    )
+    
+    if strategy == "in_place" and not old_files:
+        print("Нет состояния шардов текущего индекса, выполняем blue/green синхронизацию")
+        strategy = "blue_green"
+    
+    uploaded = await upload_shards(file_path, shards, plan["added"] + plan["changed"])
+    files = merge_files(old_files, plan, uploaded)
+    file_ids = {entry["file_id"] for entry in files.values()}
+    new_state = {"count": CHUNKS_SHARD_COUNT, "files": files}
+    
+    if strategy == "in_place":
+        store_id = previous["store_id"]
+        if uploaded:
+            await attach_shards(store_id, [entry["file_id"] for entry in uploaded.values()])
+        # Запись заменяется одной операцией: другие воркеры не увидят режим без индекса
+        await asyncio.to_thread(
+            store_registry.register,
+            key, "chunks", store_id, mode_params, data_hash, shards=new_state, replaces=store_id
+        )
+        await discard_files(stale_file_ids(old_files, plan, files), store_id)
+        vector_stores["chunks"] = store_id
+    else:
+        name = "FAQ Custom Chunks for Demo chunk_search"
+        vector_store = await async_client.vector_stores.create(
+            name=name,
+            file_ids=sorted(file_ids),
+            expires_after={"anchor": "last_active_at", "days": 1}
+        )
+        store_id = vector_store.id
+        try:
+            await wait_for_vector_store(store_id, name)
+        except Exception:
+            # Старый индекс продолжает обслуживать поиск
+            try:
+                await async_client.vector_stores.delete(store_id)
+            except Exception as e:
+                print(f"Не удалось удалить недостроенный Vector Store {store_id}: {e}")
+            raise
+        
+        await asyncio.to_thread(
+            store_registry.register, key, "chunks", store_id, mode_params, data_hash, shards=new_state
+        )
+        vector_stores["chunks"] = store_id
+        if previous:
+            task = asyncio.create_task(retire_store(previous["store_id"], file_ids))
+            retire_tasks.add(task)
+            task.add_done_callback(retire_tasks.discard)
+    
+    await invalidate_search_cache("синхронизирован индекс chunks")
+    return {
+        "status": "synced",
+        "strategy": strategy,
+        "store_id": store_id,
+        "previous_store_id": previous["store_id"] if previous else None,
+        "records": sum(len(lines) for lines in shards.values()),
+        "shards": {change: len(names) for change, names in plan.items()},
+        "elapsed": round(time.monotonic() - started, 2)
+    }
+
+
+@app.post("/api/sync/chunks")
+async def sync_chunks(request: SyncRequest = None):
+    """Инкрементально обновить индекс режима chunks после изменения JSONL файла
+
+    Загружаются только измененные шарды; поиск во время обновления продолжает
+    работать по текущему индексу.
+    """
+    if request is None:
+        request = SyncRequest()
+    if request.strategy not in SYNC_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестная стратегия '{request.strategy}'. Доступные: {', '.join(SYNC_STRATEGIES)}"
+        )
+    if chunks_sync_lock.locked():
+        raise HTTPException(status_code=409, detail="Синхронизация уже выполняется")
+    
+    async with chunks_sync_lock, store_locks["chunks"]:
+        try:
+            return await sync_chunks_store(request.strategy)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            print(f"Ошибка при синхронизации chunks: {e}")
+            raise HTTPException(status_code=500, detail=f"Ошибка при синхронизации: {str(e)}")
+
+
+async def cached_search(
+    query: str,
+    mode: str,
+    store_id: str,
+    max_num_results: int,
+    retrieval_only: bool = False,
+    include_raw: bool = False
+) -> tuple[dict, bool]:
+    """Поиск через кэш: при промахе вызывается search_in_store (или retrieve_chunks)
+
+    Одинаковые одновременные промахи объединяются: upstream вызывается один
+    раз, остальные запросы получают тот же результат.
+
+    Returns:
+        Кортеж (результат поиска, получен ли результат из кэша)
+    """
+    cache_key = search_cache_key(
+        query, mode, store_id, max_num_results, retrieval_only, include_raw
+    )
+    timings = metrics.Timings()
+    with timings.stage("cache"):
+        result = await search_cache.aget(cache_key) if cache_key else None
+    if result is not None:
+        metrics.SEARCHES.inc(mode=mode, result="hit")
+        # Этапы исходного поиска к ответу из кэша не относятся
+        return {**result, "timings": timings.to_dict()}, True
+    
+    async def run() -> dict:
+        started = time.perf_counter()
+        with upstream_admission.admit():
+            if retrieval_only:
+                result = await retrieve_chunks(query, store_id, max_num_results, include_raw)
+            else:
+                result = await search_in_store(query, store_id, max_num_results, include_raw)
+        if cache_key:
+            await search_cache.aset(cache_key, result, time.perf_counter() - started)
+        return result
+    
+    flight_key = cache_key or search_key(
+        query, mode, store_id, max_num_results, retrieval_only, include_raw
+    )
+    try:
+        result, shared = await search_flights.do(flight_key, run)
+    except Overloaded:
+        metrics.SEARCHES.inc(mode=mode, result="rejected")
+        raise
+    except Exception:
+        metrics.SEARCHES.inc(mode=mode, result="error")
+        raise
+    metrics.SEARCHES.inc(mode=mode, result="shared" if shared else "miss")
+    return result, False
+
+
+async def adopt_active_store(mode: str) -> Optional[str]:
+    """Сверить индекс режима с реестром и вернуть актуальный ID
+
+    Реестр общий для воркеров: индекс мог быть создан, переключен
+    синхронизацией или удален в другом воркере. Проверка стоит одного
+    stat файла реестра. При смене индекса или его данных локальный кэш
+    поиска сбрасывается.
+    """
+    entry = store_registry.active_snapshot(mode)
+    version = (entry["store_id"], entry["data_hash"]) if entry else None
+    if version != active_store_versions[mode]:
+        known = active_store_versions[mode]
+        active_store_versions[mode] = version
+        vector_stores[mode] = entry["store_id"] if entry else None
+        if known is not None:
+            await invalidate_search_cache(f"сменился активный индекс режима '{mode}'")
+    return vector_stores[mode]
+
+
+async def get_ready_store_id(mode: str) -> str:
+    """Получить ID готового Vector Store для режима или вернуть ошибку HTTP"""
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail="mode должен быть 'auto', 'chunks' или 'local'")
+    
+    # Локальный режим не зависит от Vector Store
+    if mode == "local":
+        return LOCAL_STORE_ID
+    
+    store_id = await adopt_active_store(mode)
     if not store_id:
         raise HTTPException(
             status_code=503,
-            detail=f"Vector Store для режима '{request.mode}' еще не готов"
+            detail=f"Vector Store для режима '{mode}' еще не готов"
         )
+    return store_id
+
+
+async def resolve_search_target(mode: Optional[str], collection: Optional[str]) -> tuple[str, str, dict]:
+    """Режим, ID Vector Store и арендатор запроса поиска
+
+    Коллекция задает Vector Store и лимиты своего арендатора (режим
+    "collection"), встроенные режимы относятся к арендатору по умолчанию.
+
+    Returns:
+        Кортеж (режим, ID Vector Store, запись с полями tenant, rate_limit, burst)
+    """
+    if collection:
+        entry = collection_registry.get(collection)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Коллекция '{collection}' не найдена")
+        return "collection", entry["store_id"], entry
+    if mode is None:
+        raise HTTPException(status_code=400, detail="Укажите mode или collection")
+    return mode, await get_ready_store_id(mode), {"tenant": DEFAULT_TENANT}
+
+
+def too_many_requests(error: Overloaded) -> HTTPException:
+    """Ответ 429 с Retry-After для отклоненного лимитом запроса"""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": error.retry_after_header}
+    )
+
+
+def check_tenant_limit(tenant: dict, cost: int = 1):
+    """Списать запросы из лимита арендатора или вернуть 429"""
+    try:
+        tenant_limiter.check(tenant["tenant"], cost, tenant.get("rate_limit"), tenant.get("burst"))
+    except Overloaded as e:
+        raise too_many_requests(e)
+
+
+@app.post("/api/search", response_model=SearchResponse, response_class=FastJSONResponse)
+async def search(request: SearchRequest):
+    """Выполнить поиск
+
+    Ответ сериализуется напрямую (orjson, если установлен), без повторной
+    валидации через response_model. raw_response добавляется только при include_raw.
+    """
+    mode, store_id, tenant = await resolve_search_target(request.mode, request.collection)
+    validate_chunk_shape(request.chunk_fields, request.max_chunk_chars)
+    check_tenant_limit(tenant)
     
     try:
-        result = search_in_store(request.query, store_id, request.max_num_results)
-        return SearchResponse(
-            answer=result["answer"],
-            chunks=result["chunks"],
-            mode=request.mode,
-            store_id=store_id,
-            raw_response=result["raw_response"]
+        result, cached = await cached_search(
+            request.query,
+            mode,
+            store_id,
+            request.max_num_results,
+            request.retrieval_only,
+            request.include_raw
         )
+    except Overloaded as e:
+        raise too_many_requests(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при поиске: {str(e)}")
+    
+    content = {
+        "answer": result["answer"],
+        "chunks": shape_chunks(result["chunks"], request.chunk_fields, request.max_chunk_chars),
+        "mode": mode,
+        "store_id": store_id,
+        "collection": request.collection,
+        "usage": result.get("usage"),
+        "cached": cached,
+        "timings": result.get("timings", {})
+    }
+    if request.include_raw:
+        content["raw_response"] = result.get("raw_response")
+    with metrics.stage("render"):
+        return FastJSONResponse(content)
+
+
+@app.post("/api/search/stream")
+async def search_stream(request: SearchRequest):
+    """Потоковый поиск (SSE): сначала найденные фрагменты, затем текст ответа"""
+    mode, store_id, tenant = await resolve_search_target(request.mode, request.collection)
+    
+    validate_chunk_shape(request.chunk_fields, request.max_chunk_chars)
+    check_tenant_limit(tenant)
+    shape = {
+        "include_raw": request.include_raw,
+        "chunk_fields": request.chunk_fields,
+        "max_chunk_chars": request.max_chunk_chars
+    }
+    
+    # Без генерации потоковая передача не нужна: отдаем найденные чанки сразу
+    if request.retrieval_only:
+        try:
+            result, cached = await cached_search(
+                request.query,
+                mode,
+                store_id,
+                request.max_num_results,
+                True,
+                request.include_raw
+            )
+        except Overloaded as e:
+            raise too_many_requests(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка при поиске: {str(e)}")
+        return StreamingResponse(
+            replay_search_result(result, cached, **shape),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Store-Id": store_id}
+        )
+    
+    cache_key = search_cache_key(
+        request.query, mode, store_id, request.max_num_results, False, request.include_raw
+    )
+    timings = metrics.Timings()
+    with timings.stage("cache"):
+        cached_result = await search_cache.aget(cache_key) if cache_key else None
+    if cached_result is not None:
+        metrics.SEARCHES.inc(mode=mode, result="hit")
+        events = replay_search_result({**cached_result, "timings": timings.to_dict()}, True, **shape)
+    else:
+        # Место в очереди занимает сам поток; здесь перегрузка отклоняется до начала ответа
+        try:
+            upstream_admission.check()
+        except Overloaded as e:
+            metrics.SEARCHES.inc(mode=mode, result="rejected")
+            raise too_many_requests(e)
+        metrics.SEARCHES.inc(mode=mode, result="miss")
+        events = stream_search_in_store(
+            request.query, store_id, request.max_num_results, cache_key, **shape
+        )
+    
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Store-Id": store_id
+        }
+    )
+
+
+async def run_batch_search(request: BatchSearchRequest, store_ids: dict[str, str]):
+    """Выполнить пакет запросов пулом воркеров и отдавать результаты в NDJSON
+
+    Каждая пара (запрос, режим) - отдельная задача. Не более request.concurrency
+    задач выполняются одновременно, результаты отдаются по мере готовности.
+    Каждая пара списывает один токен из лимита арендатора, при исчерпании
+    лимита воркер ждет токен, поэтому пакет любого размера идет со скоростью
+    лимита (время ожидания - в поле waited).
+    """
+    jobs: asyncio.Queue = asyncio.Queue()
+    results: asyncio.Queue = asyncio.Queue()
+    for index, query in enumerate(request.queries):
+        for mode in request.modes:
+            jobs.put_nowait((index, query, mode))
+    total = jobs.qsize()
+    
+    async def worker():
+        while not jobs.empty():
+            index, query, mode = jobs.get_nowait()
+            item = {"index": index, "query": query, "mode": mode, "store_id": store_ids[mode]}
+            started = time.perf_counter()
+            try:
+                waited = await tenant_limiter.acquire(DEFAULT_TENANT)
+                if waited:
+                    item["waited"] = round(waited, 3)
+                    started = time.perf_counter()
+                result, cached = await cached_search(
+                    query, mode, store_ids[mode], request.max_num_results, request.retrieval_only
+                )
+                item.update({
+                    "answer": result["answer"],
+                    "chunks": shape_chunks(
+                        result["chunks"], request.chunk_fields, request.max_chunk_chars
+                    ),
+                    "usage": result.get("usage"),
+                    "cached": cached,
+                    "timings": result.get("timings", {})
+                })
+            except Exception as e:
+                item["error"] = str(e)
+            item["elapsed"] = round(time.perf_counter() - started, 3)
+            await results.put(item)
+    
+    concurrency = max(1, min(request.concurrency, BATCH_MAX_CONCURRENCY, total))
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        for _ in range(total):
+            item = await results.get()
+            yield dump_json(item) + "\n"
+    finally:
+        # Клиент отключился или пакет завершен - останавливаем воркеры
+        for task in workers:
+            task.cancel()
+
+
+@app.post("/api/search/batch")
+async def search_batch(request: BatchSearchRequest):
+    """Пакетный поиск: много запросов по нескольким режимам, ответ в NDJSON
+
+    Каждая строка ответа - результат одной пары (запрос, режим) с полями
+    index, query, mode, store_id, answer, chunks, usage, cached, elapsed
+    (или error) и waited, если пара ждала лимит арендатора. Строки приходят
+    в порядке готовности.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Список queries пуст")
+    validate_chunk_shape(request.chunk_fields, request.max_chunk_chars)
+    if len(request.queries) * len(request.modes) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком большой пакет: не более {BATCH_MAX_ITEMS} пар (запрос, режим)"
+        )
+    
+    store_ids = {mode: await get_ready_store_id(mode) for mode in request.modes}
+    
+    return StreamingResponse(
+        run_batch_search(request, store_ids),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Статистика кэша поиска: попадания, промахи, сэкономленное время и токены
+
+    single_flight - объединение одинаковых одновременных поисков (shared -
+    сколько запросов получили результат чужого вызова upstream).
+    """
+    if search_cache is None:
+        return {"enabled": False, "single_flight": search_flights.stats()}
+    return {"enabled": True, **await search_cache.astats(), "single_flight": search_flights.stats()}
+
+
+@app.post("/api/cache/clear")
+async def clear_cache():
+    """Очистить кэш поиска"""
+    await invalidate_search_cache("очистка по запросу")
+    return {"success": True}
+
+
+def pool_stats(http_client) -> dict:
+    """Состояние пула соединений httpx
+
+    httpx не предоставляет публичного API для пула, поэтому используются
+    внутренние атрибуты httpcore; при их отсутствии возвращается available=False.
+    """
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {"available": False}
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {
+        "available": True,
+        "connections": len(connections),
+        "active": len(connections) - idle,
+        "idle": idle,
+        "http2": sum(1 for conn in connections if "HTTP/2" in conn.info()),
+        "queued": sum(
+            1 for request in getattr(pool, "_requests", [])
+            if getattr(request, "is_queued", lambda: False)()
+        )
+    }
+
+
+@app.get("/api/upstream/stats")
+async def get_upstream_stats():
+    """Настройки и состояние пулов соединений к upstream API, очереди и лимитов арендаторов"""
+    return {
+        "base_url": YANDEX_BASE_URL,
+        "http2": UPSTREAM_HTTP2_ENABLED,
+        "limits": {
+            "max_connections": UPSTREAM_MAX_CONNECTIONS,
+            "max_keepalive_connections": UPSTREAM_MAX_KEEPALIVE,
+            "keepalive_expiry": UPSTREAM_KEEPALIVE_EXPIRY,
+            "connect_timeout": UPSTREAM_CONNECT_TIMEOUT,
+            "timeout": UPSTREAM_TIMEOUT
+        },
+        "policies": UPSTREAM_POLICIES,
+        "concurrency": UPSTREAM_CONCURRENCY,
+        "admission": upstream_admission.stats(),
+        "tenants": tenant_limiter.stats(),
+        "pools": {
+            "async": pool_stats(async_http_client),
+            "sync": pool_stats(sync_http_client)
+        }
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики в формате Prometheus: этапы поиска, HTTP запросы, загрузка и индексация"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+"""
+Метрики в формате Prometheus
+
+Минимальная реализация счетчиков и гистограмм с метками и текстового
+формата экспозиции (text/plain; version=0.0.4) без внешних зависимостей.
+
+Метрики хранятся в памяти процесса: при нескольких воркерах uvicorn
+каждый воркер отдает собственные значения.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+from typing import Iterator
+
+
+# Границы корзин гистограмм, сек: от быстрых этапов до индексации
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: list["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Базовая метрика с метками; значения защищены блокировкой (для пула потоков)"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счетчики корзин (последняя - +Inf), сумма и количество
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Измерить длительность блока"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "chunk_search_stage_seconds",
+    "Длительность этапов обработки: поиск, генерация, сериализация, загрузка, индексация",
+    ("stage",)
+)
+
+HTTP_REQUESTS = Counter(
+    "chunk_search_http_requests_total",
+    "HTTP запросы к API",
+    ("method", "path", "status")
+)
+
+HTTP_SECONDS = Histogram(
+    "chunk_search_http_request_seconds",
+    "Время обработки HTTP запроса (для потоковых ответов - до отправки заголовков)",
+    ("method", "path")
+)
+
+SEARCHES = Counter(
+    "chunk_search_searches_total",
+    "Поисковые запросы по режимам и результату (hit, miss, shared, rejected, error)",
+    ("mode", "result")
+)
+
+UPSTREAM_REQUESTS = Counter(
+    "chunk_search_upstream_requests_total",
+    "HTTP запросы к upstream API (включая повторы SDK) по ресурсам",
+    ("resource",)
+)
+
+
+def stage(name: str):
+    """Измерить этап вне контекста запроса (загрузка, опрос, индексация)"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+class Timings:
+    """Время этапов обработки одного запроса
+
+    Каждый этап также попадает в гистограмму chunk_search_stage_seconds.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        """Учесть длительность этапа, измеренную вызывающим кодом"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Измерить длительность блока как этап name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def to_dict(self) -> dict[str, float]:
+        """Длительности этапов в миллисекундах"""
+        return {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
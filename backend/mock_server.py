@@ -0,0 +1,611 @@
+"""
+Локальный mock-сервер Yandex Cloud AI Studio
+
+Реализует те эндпоинты OpenAI-совместимого API, которые использует backend:
+    files          - загрузка, получение и удаление файлов
+    vector_stores  - создание, получение, удаление, список файлов, поиск
+                     и file batches
+    responses      - ответ с file_search (в том числе потоковый, SSE)
+
+Поиск выполняется локальным индексом (backend/local_index.py), ответ модели
+собирается из найденных фрагментов. Состояние хранится в памяти процесса.
+
+Задержки и ошибки настраиваются для нагрузочного тестирования:
+    --latency / --jitter   - задержка каждого запроса (нормальное распределение)
+    --response-latency     - дополнительная задержка "генерации" до первого токена
+    --token-delay          - задержка между фрагментами потокового ответа
+    --index-seconds        - время индексации Vector Store и file batch
+    --failure-rate         - доля запросов, завершающихся ошибкой --failure-status
+
+Пример:
+    uv run python -m backend.mock_server --port 8001 --latency 0.05 --failure-rate 0.01
+    YANDEX_BASE_URL=http://localhost:8001/v1 uv run python -m backend.main
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+import uuid
+from typing import Optional
+
+from fastapi import FastAPI, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from backend.chunker import estimate_tokens, static_chunks
+from backend.local_index import LocalIndex
+
+
+class MockSettings:
+    """Параметры задержек и ошибок (переменные окружения MOCK_*, флаги CLI)"""
+
+    def __init__(self):
+        self.latency = float(os.getenv("MOCK_LATENCY", "0.02"))
+        self.jitter = float(os.getenv("MOCK_JITTER", "0.005"))
+        self.response_latency = float(os.getenv("MOCK_RESPONSE_LATENCY", "0.3"))
+        self.token_delay = float(os.getenv("MOCK_TOKEN_DELAY", "0.01"))
+        self.index_seconds = float(os.getenv("MOCK_INDEX_SECONDS", "1"))
+        self.failure_rate = float(os.getenv("MOCK_FAILURE_RATE", "0"))
+        self.failure_status = int(os.getenv("MOCK_FAILURE_STATUS", "500"))
+        self.search_method = os.getenv("MOCK_SEARCH_METHOD", "bm25")
+
+
+settings = MockSettings()
+
+# Стратегия чанкования по умолчанию (как у Vector Store при chunking_strategy=auto)
+DEFAULT_CHUNKING = {"max_chunk_size_tokens": 800, "chunk_overlap_tokens": 400}
+
+# Сколько слов отдавать в одном событии response.output_text.delta
+WORDS_PER_DELTA = 3
+
+app = FastAPI(title="Yandex AI Studio Mock")
+
+files: dict[str, dict] = {}
+file_contents: dict[str, bytes] = {}
+stores: dict[str, dict] = {}
+batches: dict[str, dict] = {}
+stats = {"requests": 0, "failures": 0, "by_path": {}}
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def not_found(kind: str, object_id: str) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"{kind} {object_id} not found")
+
+
+@app.exception_handler(HTTPException)
+async def openai_error(request: Request, exc: HTTPException):
+    """Ошибки в формате OpenAI API: {"error": {"message", "type", "code"}}"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": {"message": exc.detail, "type": "invalid_request_error", "code": None}},
+        headers=exc.headers
+    )
+
+
+@app.middleware("http")
+async def inject_latency_and_failures(request: Request, call_next):
+    """Задержка каждого запроса и случайные ошибки upstream"""
+    path = request.url.path
+    if not path.startswith("/v1/"):
+        return await call_next(request)
+
+    stats["requests"] += 1
+    route = f"{request.method} {path.split('/')[2]}"
+    stats["by_path"][route] = stats["by_path"].get(route, 0) + 1
+
+    delay = random.gauss(settings.latency, settings.jitter)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    if settings.failure_rate and random.random() < settings.failure_rate:
+        stats["failures"] += 1
+        status = settings.failure_status
+        headers = {"Retry-After": "1"} if status == 429 else None
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+            headers=headers
+        )
+    return await call_next(request)
+
+
+def paginate(items: list[dict], limit: int, after: Optional[str]) -> dict:
+    """Курсорная страница списка в формате OpenAI (object=list, has_more)"""
+    start = 0
+    if after:
+        start = next((i + 1 for i, item in enumerate(items) if item["id"] == after), len(items))
+    page = items[start:start + limit]
+    return {
+        "object": "list",
+        "data": page,
+        "first_id": page[0]["id"] if page else None,
+        "last_id": page[-1]["id"] if page else None,
+        "has_more": start + limit < len(items)
+    }
+
+
+# --- Files ---
+
+@app.post("/v1/files")
+async def create_file(
+    file: UploadFile,
+    purpose: str = Form(...),
+    format: Optional[str] = Form(None)
+):
+    content = await file.read()
+    file_id = new_id("file")
+    files[file_id] = {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": file.filename,
+        "purpose": purpose,
+        "status": "processed",
+        "format": format
+    }
+    file_contents[file_id] = content
+    return files[file_id]
+
+
+@app.get("/v1/files/{file_id}")
+async def retrieve_file(file_id: str):
+    if file_id not in files:
+        raise not_found("File", file_id)
+    return files[file_id]
+
+
+@app.delete("/v1/files/{file_id}")
+async def delete_file(file_id: str):
+    if files.pop(file_id, None) is None:
+        raise not_found("File", file_id)
+    file_contents.pop(file_id, None)
+    return {"id": file_id, "object": "file", "deleted": True}
+
+
+# --- Vector Stores ---
+
+def split_file(file_id: str, chunking: dict) -> list[str]:
+    """Разбить загруженный файл на чанки: JSONL с format=chunks или окна токенов"""
+    text = file_contents[file_id].decode("utf-8", errors="ignore")
+    if files[file_id]["format"] == "chunks":
+        return [json.loads(line)["body"] for line in text.splitlines() if line.strip()]
+    return static_chunks(text, chunking["max_chunk_size_tokens"], chunking["chunk_overlap_tokens"])
+
+
+def chunking_params(chunking_strategy: Optional[dict]) -> dict:
+    if chunking_strategy and chunking_strategy.get("type") == "static":
+        return chunking_strategy["static"]
+    return DEFAULT_CHUNKING
+
+
+def attach_files(store: dict, file_ids: list[str], chunking_strategy: Optional[dict]) -> float:
+    """Добавить файлы в Vector Store и перестроить индекс
+
+    Returns:
+        Момент (time.monotonic), когда файлы будут считаться проиндексированными
+    """
+    for file_id in file_ids:
+        if file_id not in files:
+            raise not_found("File", file_id)
+
+    ready_at = time.monotonic() + settings.index_seconds
+    chunking = chunking_params(chunking_strategy)
+    for file_id in file_ids:
+        store["files"][file_id] = {
+            "id": file_id,
+            "object": "vector_store.file",
+            "created_at": int(time.time()),
+            "usage_bytes": files[file_id]["bytes"],
+            "vector_store_id": store["id"],
+            "last_error": None,
+            "chunks": split_file(file_id, chunking),
+            "ready_at": ready_at
+        }
+
+    rebuild_index(store)
+    store["ready_at"] = max(store["ready_at"], ready_at)
+    return ready_at
+
+
+def rebuild_index(store: dict):
+    """Перестроить локальный индекс Vector Store по текущему набору файлов"""
+    sources = [(file_id, text) for file_id, entry in store["files"].items() for text in entry["chunks"]]
+    store["sources"] = [file_id for file_id, _ in sources]
+    store["index"] = LocalIndex([text for _, text in sources]) if sources else None
+
+
+def file_status(entry: dict) -> str:
+    return "completed" if time.monotonic() >= entry["ready_at"] else "in_progress"
+
+
+def file_counts(entries: list[dict]) -> dict:
+    statuses = [file_status(entry) for entry in entries]
+    return {
+        "in_progress": statuses.count("in_progress"),
+        "completed": statuses.count("completed"),
+        "failed": 0,
+        "cancelled": 0,
+        "total": len(statuses)
+    }
+
+
+def store_view(store: dict) -> dict:
+    entries = list(store["files"].values())
+    return {
+        "id": store["id"],
+        "object": "vector_store",
+        "created_at": store["created_at"],
+        "name": store["name"],
+        "usage_bytes": sum(entry["usage_bytes"] for entry in entries),
+        "file_counts": file_counts(entries),
+        "status": "completed" if time.monotonic() >= store["ready_at"] else "in_progress",
+        "expires_after": store["expires_after"],
+        "last_active_at": store["created_at"],
+        "metadata": {}
+    }
+
+
+def store_file_view(entry: dict) -> dict:
+    view = {k: v for k, v in entry.items() if k not in ("chunks", "ready_at")}
+    view["status"] = file_status(entry)
+    return view
+
+
+def get_store(store_id: str) -> dict:
+    if store_id not in stores:
+        raise not_found("Vector store", store_id)
+    return stores[store_id]
+
+
+@app.post("/v1/vector_stores")
+async def create_vector_store(request: Request):
+    body = await request.json()
+    store_id = new_id("vs")
+    store = {
+        "id": store_id,
+        "name": body.get("name") or "",
+        "created_at": int(time.time()),
+        "expires_after": body.get("expires_after"),
+        "files": {},
+        "sources": [],
+        "index": None,
+        "ready_at": time.monotonic()
+    }
+    attach_files(store, body.get("file_ids") or [], body.get("chunking_strategy"))
+    stores[store_id] = store
+    return store_view(store)
+
+
+@app.get("/v1/vector_stores/{store_id}")
+async def retrieve_vector_store(store_id: str):
+    return store_view(get_store(store_id))
+
+
+@app.delete("/v1/vector_stores/{store_id}")
+async def delete_vector_store(store_id: str):
+    if stores.pop(store_id, None) is None:
+        raise not_found("Vector store", store_id)
+    return {"id": store_id, "object": "vector_store.deleted", "deleted": True}
+
+
+@app.get("/v1/vector_stores/{store_id}/files")
+async def list_vector_store_files(
+    store_id: str,
+    limit: int = 20,
+    after: Optional[str] = None,
+    filter: Optional[str] = None
+):
+    entries = [store_file_view(entry) for entry in get_store(store_id)["files"].values()]
+    if filter:
+        entries = [entry for entry in entries if entry["status"] == filter]
+    return paginate(entries, limit, after)
+
+
+@app.delete("/v1/vector_stores/{store_id}/files/{file_id}")
+async def delete_vector_store_file(store_id: str, file_id: str):
+    store = get_store(store_id)
+    if store["files"].pop(file_id, None) is None:
+        raise not_found("Vector store file", file_id)
+    rebuild_index(store)
+    return {"id": file_id, "object": "vector_store.file.deleted", "deleted": True}
+
+
+def search_store(store: dict, query: str, max_num_results: int) -> list[dict]:
+    """Найти чанки в Vector Store локальным индексом"""
+    if store["index"] is None:
+        return []
+    results = []
+    for hit in store["index"].search(query, max_num_results, settings.search_method):
+        # LocalIndex нумерует документы как "local:<номер>"
+        file_id = store["sources"][int(hit["file_id"].split(":", 1)[1])]
+        results.append({
+            "file_id": file_id,
+            "filename": files[file_id]["filename"] if file_id in files else "",
+            "score": hit["score"],
+            "text": hit["text"],
+            "attributes": {}
+        })
+    return results
+
+
+@app.post("/v1/vector_stores/{store_id}/search")
+async def search_vector_store(store_id: str, request: Request):
+    body = await request.json()
+    query = body["query"] if isinstance(body["query"], str) else " ".join(body["query"])
+    results = search_store(get_store(store_id), query, body.get("max_num_results", 10))
+    return {
+        "object": "vector_store.search_results.page",
+        "search_query": [query],
+        "data": [
+            {
+                "file_id": r["file_id"],
+                "filename": r["filename"],
+                "score": r["score"],
+                "attributes": r["attributes"],
+                "content": [{"type": "text", "text": r["text"]}]
+            }
+            for r in results
+        ],
+        "has_more": False,
+        "next_page": None
+    }
+
+
+# --- File batches ---
+
+def batch_view(batch: dict) -> dict:
+    store = get_store(batch["vector_store_id"])
+    entries = [store["files"][file_id] for file_id in batch["file_ids"] if file_id in store["files"]]
+    counts = file_counts(entries)
+    return {
+        "id": batch["id"],
+        "object": "vector_store.files_batch",
+        "created_at": batch["created_at"],
+        "vector_store_id": batch["vector_store_id"],
+        "status": "completed" if counts["in_progress"] == 0 else "in_progress",
+        "file_counts": counts
+    }
+
+
+def get_batch(store_id: str, batch_id: str) -> dict:
+    batch = batches.get(batch_id)
+    if batch is None or batch["vector_store_id"] != store_id:
+        raise not_found("File batch", batch_id)
+    return batch
+
+
+@app.post("/v1/vector_stores/{store_id}/file_batches")
+async def create_file_batch(store_id: str, request: Request):
+    body = await request.json()
+    store = get_store(store_id)
+    attach_files(store, body["file_ids"], body.get("chunking_strategy"))
+    batch_id = new_id("vsfb")
+    batches[batch_id] = {
+        "id": batch_id,
+        "created_at": int(time.time()),
+        "vector_store_id": store_id,
+        "file_ids": list(body["file_ids"])
+    }
+    return batch_view(batches[batch_id])
+
+
+@app.get("/v1/vector_stores/{store_id}/file_batches/{batch_id}")
+async def retrieve_file_batch(store_id: str, batch_id: str):
+    return batch_view(get_batch(store_id, batch_id))
+
+
+@app.get("/v1/vector_stores/{store_id}/file_batches/{batch_id}/files")
+async def list_file_batch_files(
+    store_id: str,
+    batch_id: str,
+    limit: int = 20,
+    after: Optional[str] = None,
+    filter: Optional[str] = None
+):
+    store = get_store(store_id)
+    entries = [
+        store_file_view(store["files"][file_id])
+        for file_id in get_batch(store_id, batch_id)["file_ids"]
+        if file_id in store["files"]
+    ]
+    if filter:
+        entries = [entry for entry in entries if entry["status"] == filter]
+    return paginate(entries, limit, after)
+
+
+# --- Responses ---
+
+def input_text(value) -> str:
+    """Текст запроса из поля input (строка или список сообщений)"""
+    if isinstance(value, str):
+        return value
+    parts = []
+    for message in value or []:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(c.get("text", "") for c in content if isinstance(c, dict))
+    return "\n".join(parts)
+
+
+def compose_answer(query: str, results: list[dict], context: str) -> str:
+    """Детерминированный "ответ модели" из первого найденного фрагмента"""
+    source = results[0]["text"] if results else context
+    words = source.split()[:60]
+    if not words:
+        return "В базе знаний нет информации по этому вопросу."
+    return f"По запросу «{query}» найдено: " + " ".join(words)
+
+
+def build_response(body: dict) -> tuple[dict, Optional[dict]]:
+    """Собрать объект Response и элемент file_search_call (если был поиск)
+
+    Returns:
+        Кортеж (response, file_search_call или None)
+    """
+    query = input_text(body.get("input"))
+    output = []
+    search_call = None
+    results: list[dict] = []
+
+    for tool in body.get("tools") or []:
+        if tool.get("type") != "file_search":
+            continue
+        limit = tool.get("max_num_results", 10)
+        for store_id in tool.get("vector_store_ids", []):
+            results.extend(search_store(get_store(store_id), query, limit))
+        results = sorted(results, key=lambda r: r["score"], reverse=True)[:limit]
+        search_call = {
+            "id": new_id("fs"),
+            "type": "file_search_call",
+            "status": "completed",
+            "queries": [query],
+            "results": results
+        }
+        output.append(search_call)
+
+    answer = compose_answer(query.rsplit("Вопрос: ", 1)[-1], results, query)
+    output.append({
+        "id": new_id("msg"),
+        "type": "message",
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": answer, "annotations": []}]
+    })
+
+    input_tokens = estimate_tokens(body.get("instructions") or "") + estimate_tokens(query)
+    input_tokens += sum(estimate_tokens(r["text"]) for r in results)
+    output_tokens = estimate_tokens(answer)
+    response = {
+        "id": new_id("resp"),
+        "object": "response",
+        "created_at": time.time(),
+        "model": body.get("model", ""),
+        "status": "completed",
+        "instructions": body.get("instructions"),
+        "output": output,
+        "tools": body.get("tools") or [],
+        "tool_choice": "auto",
+        "parallel_tool_calls": True,
+        "temperature": 1.0,
+        "top_p": 1.0,
+        "error": None,
+        "incomplete_details": None,
+        "metadata": {},
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens
+        }
+    }
+    return response, search_call
+
+
+async def stream_response(response: dict, search_call: Optional[dict]):
+    """События Responses streaming API для готового ответа"""
+    sequence = itertools.count()
+
+    def event(data: dict) -> str:
+        data["sequence_number"] = next(sequence)
+        return f"event: {data['type']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    in_progress = {**response, "status": "in_progress", "output": [], "usage": None}
+    yield event({"type": "response.created", "response": in_progress})
+
+    output_index = 0
+    if search_call:
+        yield event({"type": "response.output_item.done", "output_index": 0, "item": search_call})
+        output_index = 1
+
+    await asyncio.sleep(settings.response_latency)
+
+    message = response["output"][output_index]
+    text = message["content"][0]["text"]
+    yield event({
+        "type": "response.output_item.added",
+        "output_index": output_index,
+        "item": {**message, "status": "in_progress", "content": []}
+    })
+    words = text.split(" ")
+    for i in range(0, len(words), WORDS_PER_DELTA):
+        delta = " ".join(words[i:i + WORDS_PER_DELTA]) + (" " if i + WORDS_PER_DELTA < len(words) else "")
+        yield event({
+            "type": "response.output_text.delta",
+            "item_id": message["id"],
+            "output_index": output_index,
+            "content_index": 0,
+            "delta": delta,
+            "logprobs": []
+        })
+        await asyncio.sleep(settings.token_delay)
+    yield event({
+        "type": "response.output_text.done",
+        "item_id": message["id"],
+        "output_index": output_index,
+        "content_index": 0,
+        "text": text,
+        "logprobs": []
+    })
+    yield event({"type": "response.output_item.done", "output_index": output_index, "item": message})
+    yield event({"type": "response.completed", "response": response})
+
+
+@app.post("/v1/responses")
+async def create_response(request: Request):
+    body = await request.json()
+    response, search_call = build_response(body)
+
+    if body.get("stream"):
+        return StreamingResponse(stream_response(response, search_call), media_type="text/event-stream")
+
+    await asyncio.sleep(settings.response_latency)
+    return response
+
+
+# --- Служебные эндпоинты ---
+
+@app.get("/mock/stats")
+async def get_stats():
+    """Счетчики запросов и внедренных ошибок"""
+    return {
+        **stats,
+        "files": len(files),
+        "vector_stores": len(stores),
+        "settings": vars(settings)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock-сервер Yandex Cloud AI Studio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=settings.latency, help="Задержка запроса, с")
+    parser.add_argument("--jitter", type=float, default=settings.jitter, help="Разброс задержки, с")
+    parser.add_argument("--response-latency", type=float, default=settings.response_latency)
+    parser.add_argument("--token-delay", type=float, default=settings.token_delay)
+    parser.add_argument("--index-seconds", type=float, default=settings.index_seconds)
+    parser.add_argument("--failure-rate", type=float, default=settings.failure_rate)
+    parser.add_argument("--failure-status", type=int, default=settings.failure_status)
+    parser.add_argument("--search-method", default=settings.search_method)
+    args = parser.parse_args()
+
+    for name in vars(settings):
+        setattr(settings, name, getattr(args, name))
+
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Персистентный реестр Vector Stores
+
+Хранит созданные индексы в JSON файле, чтобы перезапуск сервера или
+дополнительные воркеры uvicorn не пересоздавали их заново. Ключ записи -
+хэш содержимого файла данных вместе с режимом и параметрами чанкования:
+одинаковая конфигурация никогда не индексируется дважды.
+
+Там же хранится манифест загруженных файлов: повторная загрузка файла
+с тем же содержимым заменяется ссылкой на уже существующий ID.
+
+Именованные коллекции (Vector Store арендатора или корпуса) хранятся
+в отдельном файле того же формата.
+
+Запись в файл защищена блокировкой (fcntl.flock), поэтому реестр можно
+разделять между процессами на одном хосте.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка между процессами недоступна
+    fcntl = None
+
+
+_hash_cache: dict[pathlib.Path, tuple[float, int, str]] = {}
+
+
+def hash_file(path: pathlib.Path) -> str:
+    """SHA-256 содержимого файла (потоково), с кэшем по mtime и размеру"""
+    stat = path.stat()
+    cached = _hash_cache.get(path)
+    if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    _hash_cache[path] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+
+def config_key(mode: str, data_hash: str, params: dict) -> str:
+    """Ключ конфигурации индекса: режим, хэш данных и параметры чанкования"""
+    payload = json.dumps([mode, data_hash, params], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@contextlib.contextmanager
+def locked(path: pathlib.Path):
+    """Эксклюзивная блокировка файла реестра между процессами"""
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class JsonFileStore:
+    """JSON документ на диске с атомарной записью под блокировкой"""
+
+    def __init__(self, path: pathlib.Path, default: dict):
+        self.path = path
+        self.default = default
+        self._snapshot: Optional[tuple[tuple, dict]] = None
+
+    def _read(self) -> dict:
+        if not self.path.exists():
+            return json.loads(json.dumps(self.default))
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, data: dict):
+        tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def read(self) -> dict:
+        """Прочитать текущее содержимое"""
+        with locked(self.path):
+            return self._read()
+
+    def snapshot(self) -> dict:
+        """Содержимое для чтения на каждом запросе (изменять нельзя)
+
+        Кэшируется в процессе и перечитывается, только когда меняется файл
+        (mtime, размер или inode после атомарной замены), в том числе
+        записью из другого воркера. Чтение идет без блокировки: запись
+        атомарно заменяет файл, поэтому документ всегда целый, а запрос не
+        ждет чужую запись.
+        """
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return self.default
+        version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if self._snapshot is None or self._snapshot[0] != version:
+            try:
+                self._snapshot = (version, self._read())
+            except FileNotFoundError:
+                return self.default
+        return self._snapshot[1]
+
+    @contextlib.contextmanager
+    def update(self):
+        """Изменить содержимое: блокировка, чтение, изменение и атомарная запись"""
+        with locked(self.path):
+            data = self._read()
+            yield data
+            self._write(data)
+
+
+class StoreRegistry(JsonFileStore):
+    """Реестр Vector Stores
+
+    Формат файла:
+        {
+            "stores": {<config_key>: {"mode", "store_id", "params", "data_hash", "created_at", "shards"?}},
+            "active": {<mode>: <config_key>}
+        }
+
+    Поле shards есть у индексов, собранных инкрементальной синхронизацией
+    (backend/shards.py): {"count", "files": {<шард>: {"hash", "file_id", "records"}}}.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        super().__init__(path, {"stores": {}, "active": {}})
+
+    def get(self, key: str) -> Optional[dict]:
+        """Запись о Vector Store для ключа конфигурации"""
+        return self.read()["stores"].get(key)
+
+    def active(self, mode: str) -> Optional[dict]:
+        """Запись об активном Vector Store режима"""
+        data = self.read()
+        key = data["active"].get(mode)
+        return data["stores"].get(key) if key else None
+
+    def register(
+        self,
+        key: str,
+        mode: str,
+        store_id: str,
+        params: dict,
+        data_hash: str,
+        shards: Optional[dict] = None,
+        replaces: Optional[str] = None
+    ):
+        """Сохранить Vector Store и сделать его активным для режима
+
+        replaces - ID Vector Store, прежние записи которого удаляются в той же
+        записи файла (обновление индекса на месте под новым ключом).
+        """
+        with self.update() as data:
+            if replaces:
+                for old_key in [k for k, v in data["stores"].items() if v["store_id"] == replaces]:
+                    del data["stores"][old_key]
+            data["stores"][key] = {
+                "mode": mode,
+                "store_id": store_id,
+                "params": params,
+                "data_hash": data_hash,
+                "created_at": time.time()
+            }
+            if shards is not None:
+                data["stores"][key]["shards"] = shards
+            data["active"][mode] = key
+
+    def active_snapshot(self, mode: str) -> Optional[dict]:
+        """active() по кэшу процесса: дешевая проверка на каждом поиске"""
+        data = self.snapshot()
+        key = data["active"].get(mode)
+        return data["stores"].get(key) if key else None
+
+    def activate(self, mode: str, key: str):
+        """Сделать существующую запись активной для режима"""
+        with self.update() as data:
+            if key in data["stores"]:
+                data["active"][mode] = key
+
+    def remove(self, store_id: str):
+        """Удалить записи с указанным ID Vector Store"""
+        with self.update() as data:
+            keys = [k for k, v in data["stores"].items() if v["store_id"] == store_id]
+            for key in keys:
+                del data["stores"][key]
+            data["active"] = {m: k for m, k in data["active"].items() if k not in keys}
+
+
+class CollectionRegistry(JsonFileStore):
+    """Именованные коллекции для поиска по произвольным Vector Stores
+
+    Поиск читает коллекции на каждом запросе, поэтому они берутся из
+    snapshot() и перечитываются только при изменении файла.
+
+    Формат файла:
+        {"collections": {<name>: {"store_id", "tenant", "rate_limit", "burst", "created_at"}}}
+    """
+
+    def __init__(self, path: pathlib.Path):
+        super().__init__(path, {"collections": {}})
+
+    def all(self) -> dict:
+        """Все коллекции (из кэша процесса, если файл не менялся)"""
+        return self.snapshot()["collections"]
+
+    def get(self, name: str) -> Optional[dict]:
+        """Запись о коллекции"""
+        return self.all().get(name)
+
+    def put(
+        self,
+        name: str,
+        store_id: str,
+        tenant: Optional[str] = None,
+        rate_limit: Optional[float] = None,
+        burst: Optional[float] = None
+    ) -> dict:
+        """Создать или обновить коллекцию (арендатор по умолчанию - имя коллекции)"""
+        entry = {
+            "store_id": store_id,
+            "tenant": tenant or name,
+            "rate_limit": rate_limit,
+            "burst": burst,
+            "created_at": time.time()
+        }
+        with self.update() as data:
+            data["collections"][name] = entry
+        return entry
+
+    def remove(self, name: str) -> bool:
+        """Удалить коллекцию (Vector Store не удаляется)"""
+        with self.update() as data:
+            return data["collections"].pop(name, None) is not None
+
+
+class FileManifest(JsonFileStore):
+    """Манифест загруженных файлов для дедупликации загрузок
+
+    Ключ - хэш содержимого файла вместе с параметрами загрузки, значение -
+    ID файла в облаке. Повторная загрузка тех же байтов не выполняется.
+
+    Формат файла:
+        {"files": {<content_key>: {"file_id", "filename", "bytes", "uploaded_at"}}}
+    """
+
+    def __init__(self, path: pathlib.Path):
+        super().__init__(path, {"files": {}})
+
+    @staticmethod
+    def content_key(data_hash: str, purpose: str, extra_body: Optional[dict]) -> str:
+        """Ключ содержимого: хэш данных и параметры, влияющие на обработку файла"""
+        payload = json.dumps([data_hash, purpose, extra_body or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Запись о загруженном файле"""
+        return self.read()["files"].get(key)
+
+    def add(self, key: str, file_id: str, filename: str, size: int):
+        """Запомнить загруженный файл"""
+        with self.update() as data:
+            data["files"][key] = {
+                "file_id": file_id,
+                "filename": filename,
+                "bytes": size,
+                "uploaded_at": time.time()
+            }
+
+    def remove(self, file_id: str):
+        """Забыть файл (например, после удаления в облаке)"""
+        with self.update() as data:
+            data["files"] = {k: v for k, v in data["files"].items() if v["file_id"] != file_id}
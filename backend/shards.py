@@ -0,0 +1,88 @@
+"""
+Шардирование JSONL файла с чанками для инкрементальной синхронизации
+
+Каждая запись попадает в шард по хэшу своего содержимого, поэтому
+изменение записи затрагивает не более двух шардов (старый и новый), а
+остальные шарды сохраняют тот же хэш и не загружаются повторно.
+
+Состояние шардов хранится в реестре Vector Stores:
+    {"count": <число шардов>, "files": {<номер шарда>: {"hash", "file_id", "records"}}}
+"""
+
+import hashlib
+import pathlib
+from typing import Optional
+
+
+DEFAULT_SHARD_COUNT = 16
+
+
+def record_shard(line: bytes, shard_count: int) -> int:
+    """Номер шарда для записи"""
+    return int.from_bytes(hashlib.sha256(line).digest()[:8], "big") % shard_count
+
+
+def split_shards(path: pathlib.Path, shard_count: int = DEFAULT_SHARD_COUNT) -> dict[str, list[bytes]]:
+    """Разложить записи JSONL файла по шардам (порядок записей внутри шарда сохраняется)
+
+    Returns:
+        Непустые шарды: номер шарда (строкой, как в JSON состоянии) -> строки
+    """
+    shards: dict[str, list[bytes]] = {}
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip(b"\r\n")
+            if line.strip():
+                shards.setdefault(str(record_shard(line, shard_count)), []).append(line)
+    return shards
+
+
+def shard_digest(lines: list[bytes]) -> str:
+    """Хэш содержимого шарда"""
+    return hashlib.sha256(b"\n".join(lines)).hexdigest()
+
+
+def plan_sync(old: Optional[dict], new: dict[str, list[bytes]]) -> dict[str, list[str]]:
+    """Сравнить шарды последней синхронизации с текущими
+
+    Returns:
+        Номера шардов по спискам added, changed, removed и unchanged
+    """
+    old = old or {}
+    plan = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for shard, lines in new.items():
+        if shard not in old:
+            plan["added"].append(shard)
+        elif old[shard]["hash"] != shard_digest(lines):
+            plan["changed"].append(shard)
+        else:
+            plan["unchanged"].append(shard)
+    plan["removed"] = [shard for shard in old if shard not in new]
+    return plan
+
+
+def previous_files(state: Optional[dict], shard_count: int) -> dict:
+    """Файлы шардов прошлой синхронизации (пусто, если ее не было или сменилось число шардов)"""
+    state = state or {}
+    return state.get("files", {}) if state.get("count") == shard_count else {}
+
+
+def merge_files(old: dict, plan: dict[str, list[str]], uploaded: dict) -> dict:
+    """Файлы шардов после синхронизации: неизмененные прежние и загруженные"""
+    return {shard: old[shard] for shard in plan["unchanged"]} | uploaded
+
+
+def stale_file_ids(old: dict, plan: dict[str, list[str]], files: dict) -> list[str]:
+    """ID файлов измененных и удаленных шардов, которые больше не используются"""
+    in_use = {entry["file_id"] for entry in files.values()}
+    return [
+        old[shard]["file_id"] for shard in plan["changed"] + plan["removed"]
+        if old[shard]["file_id"] not in in_use
+    ]
+
+
+def write_shard(directory: pathlib.Path, stem: str, shard: str, lines: list[bytes]) -> pathlib.Path:
+    """Записать шард во временный JSONL файл для загрузки"""
+    path = directory / f"{stem}.shard{int(shard):03d}.jsonl"
+    path.write_bytes(b"\n".join(lines) + b"\n")
+    return path
@@ -0,0 +1,58 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight)
+
+Первый вызов с ключом запускает работу в отдельной задаче, остальные
+вызовы с тем же ключом до ее завершения ждут общий результат (или
+исключение) вместо повторного запроса к upstream. Отмена ожидающего
+(например, при разрыве соединения клиентом) не отменяет общую задачу.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Группа вызовов, объединяемых по ключу"""
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Выполнить fn() или дождаться уже выполняющегося вызова с тем же ключом
+
+        Returns:
+            Кортеж (результат, получен ли он от другого вызова)
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.shared += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Исключение уже получено ожидающими; без этого asyncio предупреждает,
+        # если все ожидающие были отменены
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Счетчики объединения (для процесса текущего воркера)"""
+        total = self.leaders + self.shared
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "shared_rate": self.shared / total if total else 0.0
+        }
@@ -0,0 +1,314 @@
+"""
+Бенчмарк качества и скорости поиска: автоматическое чанкование против пользовательских чанков
+
+Для каждой конфигурации (режим chunks и сетка параметров режима auto)
+строит индекс, выполняет вопросы из размеченного набора и считает:
+    recall@k   - доля вопросов, для которых релевантный чанк попал в top-k
+    MRR        - средний обратный ранг первого релевантного чанка
+    p50/p95/p99 - задержка поиска
+    build      - время построения индекса
+    tokens     - токены проиндексированного корпуса и контекста, найденного на запрос
+
+Бэкенды:
+    offline - имитация upstream без сети: статическое чанкование по окнам
+              токенов и локальный индекс (backend/local_index.py)
+    live    - реальные Vector Stores через backend.main (нужны ключи Yandex Cloud)
+    replay  - воспроизведение записанного прогона (--cassette), для CI без сети
+
+Пример:
+    uv run python benchmarks/chunking_quality.py --backend offline --chunk-sizes 200,400,800 --overlaps 0,100
+    uv run python benchmarks/chunking_quality.py --backend live --record benchmarks/cassette.json
+    uv run python benchmarks/chunking_quality.py --backend replay --cassette benchmarks/cassette.json
+"""
+
+import argparse
+import asyncio
+import json
+import pathlib
+import re
+import sys
+import time
+from typing import Optional
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from backend.chunker import estimate_tokens, static_chunks  # noqa: E402
+from backend.local_index import LocalIndex  # noqa: E402
+
+DATA_DIR = ROOT / "data"
+AUTO_FILE = DATA_DIR / "faq_demo_chunks.txt"
+CHUNKS_FILE = DATA_DIR / "faq_chunks_demo_chunks.jsonl"
+DEFAULT_QUESTIONS = pathlib.Path(__file__).resolve().parent / "questions.jsonl"
+
+
+def config_label(config: dict) -> str:
+    """Короткое имя конфигурации для отчета и кассеты"""
+    if config["mode"] == "chunks":
+        return "chunks"
+    return f"auto/{config['max_chunk_size_tokens']}/{config['chunk_overlap_tokens']}"
+
+
+def load_jsonl_bodies(path: pathlib.Path) -> list[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["body"] for line in f if line.strip()]
+
+
+class OfflineBackend:
+    """Имитация upstream на локальном индексе"""
+
+    def __init__(self, method: str = "bm25"):
+        self.method = method
+        self.index: Optional[LocalIndex] = None
+
+    async def build(self, config: dict) -> dict:
+        started = time.perf_counter()
+        if config["mode"] == "chunks":
+            chunks = load_jsonl_bodies(CHUNKS_FILE)
+        else:
+            chunks = static_chunks(
+                AUTO_FILE.read_text(encoding="utf-8"),
+                config["max_chunk_size_tokens"],
+                config["chunk_overlap_tokens"]
+            )
+        self.index = LocalIndex(chunks)
+        return {
+            "build_seconds": time.perf_counter() - started,
+            "indexed_tokens": sum(estimate_tokens(chunk) for chunk in chunks),
+            "chunks": len(chunks)
+        }
+
+    async def search(self, query: str, k: int) -> list[str]:
+        return [chunk["text"] for chunk in self.index.search(query, k, self.method)]
+
+    async def teardown(self):
+        self.index = None
+
+
+class LiveBackend:
+    """Реальные Vector Stores в Yandex Cloud AI Studio"""
+
+    def __init__(self, keep: bool = False):
+        from backend import main  # импорт требует ключей Yandex Cloud
+
+        self.main = main
+        self.keep = keep
+        self.store_id: Optional[str] = None
+
+    async def build(self, config: dict) -> dict:
+        started = time.perf_counter()
+        if config["mode"] == "chunks":
+            self.store_id = await self.main.create_custom_chunks_store()
+            indexed_tokens = sum(estimate_tokens(b) for b in load_jsonl_bodies(CHUNKS_FILE))
+        else:
+            self.store_id = await self.main.create_auto_chunking_store(
+                config["max_chunk_size_tokens"], config["chunk_overlap_tokens"]
+            )
+            indexed_tokens = estimate_tokens(AUTO_FILE.read_text(encoding="utf-8"))
+        return {
+            "build_seconds": time.perf_counter() - started,
+            "indexed_tokens": indexed_tokens,
+            "chunks": None
+        }
+
+    async def search(self, query: str, k: int) -> list[str]:
+        result = await self.main.retrieve_chunks(query, self.store_id, k)
+        return [chunk["text"] for chunk in result["chunks"]]
+
+    async def teardown(self):
+        if self.store_id and not self.keep:
+            await self.main.async_client.vector_stores.delete(self.store_id)
+        self.store_id = None
+
+
+class RecordingBackend:
+    """Обертка, записывающая результаты и задержки другого бэкенда в кассету"""
+
+    def __init__(self, inner, cassette: dict):
+        self.inner = inner
+        self.cassette = cassette
+        self.current: Optional[dict] = None
+
+    async def build(self, config: dict) -> dict:
+        build = await self.inner.build(config)
+        self.current = {"build": build, "searches": {}}
+        self.cassette[config_label(config)] = self.current
+        return build
+
+    async def search(self, query: str, k: int) -> list[str]:
+        started = time.perf_counter()
+        texts = await self.inner.search(query, k)
+        self.current["searches"][f"{k}|{query}"] = {
+            "texts": texts,
+            "latency": time.perf_counter() - started
+        }
+        return texts
+
+    async def teardown(self):
+        await self.inner.teardown()
+
+
+class ReplayBackend:
+    """Воспроизведение кассеты: результаты и задержки берутся из записи"""
+
+    def __init__(self, cassette: dict):
+        self.cassette = cassette
+        self.current: Optional[dict] = None
+        self.last_latency = 0.0
+
+    async def build(self, config: dict) -> dict:
+        label = config_label(config)
+        if label not in self.cassette:
+            raise KeyError(f"В кассете нет конфигурации {label}")
+        self.current = self.cassette[label]
+        return self.current["build"]
+
+    async def search(self, query: str, k: int) -> list[str]:
+        entry = self.current["searches"][f"{k}|{query}"]
+        self.last_latency = entry["latency"]
+        return entry["texts"]
+
+    async def teardown(self):
+        self.current = None
+
+
+def is_relevant(text: str, relevant: list[str]) -> bool:
+    """Чанк релевантен, если содержит один из эталонных фрагментов"""
+    normalized = re.sub(r"\s+", " ", text)
+    return any(fragment in normalized for fragment in relevant)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Процентиль q (0..100) по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def evaluate(backend, config: dict, questions: list[dict], k: int) -> dict:
+    """Построить индекс конфигурации и прогнать по нему все вопросы"""
+    build = await backend.build(config)
+    hits = 0
+    reciprocal_ranks = []
+    latencies = []
+    context_tokens = 0
+
+    try:
+        for question in questions:
+            started = time.perf_counter()
+            texts = await backend.search(question["query"], k)
+            latency = time.perf_counter() - started
+            if isinstance(backend, ReplayBackend):
+                latency = backend.last_latency
+            latencies.append(latency)
+            context_tokens += sum(estimate_tokens(text) for text in texts)
+
+            rank = next(
+                (i for i, text in enumerate(texts, 1) if is_relevant(text, question["relevant"])),
+                None
+            )
+            if rank:
+                hits += 1
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+    finally:
+        await backend.teardown()
+
+    total = len(questions) or 1
+    return {
+        "config": config_label(config),
+        "chunks": build["chunks"],
+        f"recall@{k}": hits / total,
+        "mrr": sum(reciprocal_ranks) / total,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "build_s": build["build_seconds"],
+        "indexed_tokens": build["indexed_tokens"],
+        "context_tokens_per_query": context_tokens / total
+    }
+
+
+def build_configs(chunk_sizes: list[int], overlaps: list[int]) -> list[dict]:
+    """Сетка конфигураций: режим chunks и все допустимые пары параметров auto"""
+    configs = [{"mode": "chunks"}]
+    for size in chunk_sizes:
+        for overlap in overlaps:
+            # Ограничение AI Studio: перекрытие не больше половины размера чанка
+            if overlap <= size // 2:
+                configs.append({
+                    "mode": "auto",
+                    "max_chunk_size_tokens": size,
+                    "chunk_overlap_tokens": overlap
+                })
+    return configs
+
+
+def print_report(rows: list[dict], k: int):
+    header = (
+        f"{'config':<16} {'chunks':>6} {'recall@' + str(k):>9} {'mrr':>6} "
+        f"{'p50,ms':>8} {'p95,ms':>8} {'p99,ms':>8} {'build,s':>8} {'idx tok':>8} {'ctx tok':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        chunks = "-" if r["chunks"] is None else r["chunks"]
+        print(
+            f"{r['config']:<16} {chunks:>6} {r[f'recall@{k}']:>9.3f} {r['mrr']:>6.3f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['build_s']:>8.2f} "
+            f"{r['indexed_tokens']:>8} {r['context_tokens_per_query']:>8.0f}"
+        )
+
+
+def parse_ints(value: str) -> list[int]:
+    return [int(x) for x in value.split(",") if x.strip()]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк чанкования: auto против chunks")
+    parser.add_argument("--backend", choices=["offline", "live", "replay"], default="offline")
+    parser.add_argument("--questions", type=pathlib.Path, default=DEFAULT_QUESTIONS)
+    parser.add_argument("-k", type=int, default=3, help="Число результатов поиска")
+    parser.add_argument("--chunk-sizes", default="800", help="max_chunk_size_tokens через запятую")
+    parser.add_argument("--overlaps", default="400", help="chunk_overlap_tokens через запятую")
+    parser.add_argument("--method", default="bm25", help="Метод локального поиска для offline")
+    parser.add_argument("--record", type=pathlib.Path, help="Записать прогон в кассету")
+    parser.add_argument("--cassette", type=pathlib.Path, help="Кассета для replay")
+    parser.add_argument("--keep", action="store_true", help="Не удалять созданные Vector Stores")
+    parser.add_argument("--json", type=pathlib.Path, help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+
+    cassette: dict = {}
+    if args.backend == "offline":
+        backend = OfflineBackend(args.method)
+    elif args.backend == "live":
+        backend = LiveBackend(keep=args.keep)
+    else:
+        if not args.cassette:
+            parser.error("для --backend replay нужен --cassette")
+        cassette = json.loads(args.cassette.read_text(encoding="utf-8"))
+        backend = ReplayBackend(cassette)
+
+    if args.record and args.backend != "replay":
+        backend = RecordingBackend(backend, cassette)
+
+    rows = []
+    for config in build_configs(parse_ints(args.chunk_sizes), parse_ints(args.overlaps)):
+        print(f"Конфигурация {config_label(config)}...", file=sys.stderr)
+        rows.append(await evaluate(backend, config, questions, args.k))
+
+    print_report(rows, args.k)
+
+    if args.record:
+        args.record.write_text(json.dumps(cassette, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nКассета сохранена: {args.record}")
+    if args.json:
+        args.json.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
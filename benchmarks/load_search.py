@@ -0,0 +1,148 @@
+"""
+Нагрузочный бенчмарк для /api/search
+
+Отправляет запросы к запущенному серверу с разным уровнем параллелизма
+и показывает, как масштабируется пропускная способность (RPS).
+
+Сервер можно запустить поверх локального mock-сервера (backend/mock_server.py),
+чтобы измерить накладные расходы самого приложения без обращения к облаку.
+
+Каждый запрос по умолчанию уникален (к тексту добавляется номер прогона и
+запроса), поэтому кэш поиска не отвечает вместо upstream. Для замеров
+пропускной способности сервер лучше запускать с SEARCH_CACHE_BACKEND=none;
+--repeat-queries повторяет одни и те же запросы (замер работы кэша).
+
+Пример:
+    uv run python benchmarks/load_search.py --mode chunks --concurrency 1,4,16 --requests 64
+    uv run python benchmarks/load_search.py --initialize --concurrency 1,8,32,64
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+DEFAULT_QUERIES = [
+    "Как создать виртуальную машину?",
+    "Какие операционные системы поддерживаются?",
+    "Как работает тарификация?",
+    "Можно ли создать снимок диска?",
+]
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Процентиль q (0..100) по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_level(
+    http: httpx.AsyncClient,
+    url: str,
+    mode: str,
+    queries: list[str],
+    concurrency: int,
+    total_requests: int,
+    unique: bool = True,
+) -> dict:
+    """Выполнить total_requests запросов, держа в полете не более concurrency
+
+    При unique к каждому запросу добавляется метка, чтобы он не попал в кэш поиска.
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total_requests))
+    run_id = uuid.uuid4().hex[:8]
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            query = queries[i % len(queries)]
+            if unique:
+                query = f"{query} (прогон {run_id}, запрос {i})"
+            payload = {"query": query, "mode": mode}
+            started = time.perf_counter()
+            try:
+                response = await http.post(url, json=payload)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError as e:
+                errors += 1
+                print(f"  Ошибка запроса: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк /api/search")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Адрес сервера")
+    parser.add_argument("--mode", default="chunks", help="Режим поиска")
+    parser.add_argument(
+        "--concurrency", default="1,2,4,8,16", help="Уровни параллелизма через запятую"
+    )
+    parser.add_argument("--requests", type=int, default=32, help="Запросов на каждый уровень")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Таймаут запроса, сек")
+    parser.add_argument(
+        "--initialize", action="store_true", help="Создать индексы перед прогоном (/api/initialize)"
+    )
+    parser.add_argument(
+        "--repeat-queries",
+        action="store_true",
+        help="Повторять одни и те же запросы (по умолчанию каждый запрос уникален и минует кэш)"
+    )
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    url = f"{args.base_url.rstrip('/')}/api/search"
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+
+    results = []
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as http:
+        if args.initialize:
+            print("Инициализация индексов...")
+            response = await http.post(
+                f"{args.base_url.rstrip('/')}/api/initialize", params={"wait": "true"}
+            )
+            response.raise_for_status()
+        for level in levels:
+            print(f"Параллелизм {level}: {args.requests} запросов...")
+            results.append(
+                await run_level(
+                    http, url, args.mode, DEFAULT_QUERIES, level, args.requests,
+                    unique=not args.repeat_queries
+                )
+            )
+
+    baseline = results[0]["rps"] if results and results[0]["rps"] else None
+    print()
+    print(f"{'conc':>5} {'ok':>5} {'err':>4} {'rps':>8} {'x':>6} {'p50,s':>8} {'p95,s':>8}")
+    for r in results:
+        speedup = r["rps"] / baseline if baseline else 0.0
+        print(
+            f"{r['concurrency']:>5} {r['ok']:>5} {r['errors']:>4} {r['rps']:>8.2f} "
+            f"{speedup:>6.2f} {r['p50']:>8.3f} {r['p95']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
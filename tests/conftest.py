@@ -0,0 +1,68 @@
+"""
+Общие фикстуры: backend.main работает поверх mock-сервера AI Studio
+
+Переменные окружения задаются до импорта backend.main и backend.mock_server
+(оба читают настройки при импорте). Mock-сервер запускается один раз на
+сессию в отдельном потоке.
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import pytest
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+MOCK_PORT = free_port()
+STATE_DIR = tempfile.mkdtemp(prefix="chunk-search-tests-")
+
+os.environ.update({
+    "YANDEX_BASE_URL": f"http://127.0.0.1:{MOCK_PORT}/v1",
+    "STORE_REGISTRY_PATH": os.path.join(STATE_DIR, "store_registry.json"),
+    "FILE_MANIFEST_PATH": os.path.join(STATE_DIR, "file_manifest.json"),
+    "COLLECTIONS_PATH": os.path.join(STATE_DIR, "collections.json"),
+    "SEARCH_CACHE_BACKEND": "memory",
+    # Каждый тест выполняется в своем event loop: соединения не переиспользуются
+    "UPSTREAM_MAX_KEEPALIVE": "0",
+    "UPSTREAM_HTTP2": "false",
+    "POLL_INITIAL_INTERVAL": "0.02",
+    "POLL_MAX_INTERVAL": "0.1",
+    "POLL_DEADLINE": "10",
+    "MOCK_LATENCY": "0",
+    "MOCK_JITTER": "0",
+    "MOCK_RESPONSE_LATENCY": "0",
+    "MOCK_TOKEN_DELAY": "0",
+    "MOCK_INDEX_SECONDS": "0.05",
+})
+
+
+@pytest.fixture(scope="session")
+def mock_upstream():
+    """Mock-сервер AI Studio на MOCK_PORT"""
+    import uvicorn
+
+    from backend import mock_server
+
+    server = uvicorn.Server(uvicorn.Config(
+        mock_server.app, host="127.0.0.1", port=MOCK_PORT, log_level="warning"
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("mock-сервер не запустился")
+        time.sleep(0.01)
+    yield mock_server
+    server.should_exit = True
+    thread.join(timeout=5)
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
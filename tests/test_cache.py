@@ -0,0 +1,97 @@
+import sqlite3
+import time
+
+from backend.cache import SearchCache, SqliteCacheBackend
+
+
+def make_backend(tmp_path, **kwargs) -> SqliteCacheBackend:
+    return SqliteCacheBackend(str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_sqlite_get_does_not_write(tmp_path):
+    backend = make_backend(tmp_path)
+    backend.set("a", {"v": 1})
+    changes = backend._conn.total_changes
+
+    assert backend.get("a") == {"v": 1}
+    assert backend._conn.total_changes == changes
+
+
+def test_sqlite_reads_are_flushed_for_lru(tmp_path):
+    backend = make_backend(tmp_path, max_size=2)
+    backend.set("a", {"v": 1})
+    time.sleep(0.01)
+    backend.set("b", {"v": 2})
+    time.sleep(0.01)
+    # Чтение делает "a" свежее "b", поэтому вытесняется "b"
+    backend.get("a")
+    backend.set("c", {"v": 3})
+
+    assert backend.get("a") == {"v": 1}
+    assert backend.get("b") is None
+    assert backend.evictions == 1
+
+
+def test_sqlite_locked_write_is_skipped(tmp_path):
+    backend = make_backend(tmp_path, busy_timeout=0.01)
+    backend.set("a", {"v": 1})
+
+    other = sqlite3.connect(str(tmp_path / "cache.sqlite3"), isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        started = time.perf_counter()
+        backend.set("b", {"v": 2})
+        assert time.perf_counter() - started < 1
+        assert backend.lock_errors == 1
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+
+    assert backend.get("b") is None
+    backend.set("b", {"v": 2})
+    assert backend.get("b") == {"v": 2}
+
+
+def test_sqlite_locked_clear_is_deferred(tmp_path):
+    backend = make_backend(tmp_path, busy_timeout=0.01)
+    backend.set("a", {"v": 1})
+
+    other = sqlite3.connect(str(tmp_path / "cache.sqlite3"), isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        backend.clear()
+        assert backend.lock_errors == 1
+        # Очистка не выполнена, но устаревшие записи уже не отдаются
+        assert backend.get("a") is None
+        assert len(backend) == 0
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+
+    backend.set("b", {"v": 2})
+    assert backend.get("a") is None
+    assert backend.get("b") == {"v": 2}
+    assert len(backend) == 1
+
+
+async def test_search_cache_async_roundtrip(tmp_path):
+    cache = SearchCache(make_backend(tmp_path))
+    result = {"answer": "ok", "chunks": [], "usage": {"total_tokens": 7}}
+
+    assert await cache.aget("k") is None
+    await cache.aset("k", result, 0.5)
+
+    assert await cache.aget("k") == result
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_tokens"]) == (1, 1, 7)
+
+
+async def test_search_cache_async_clear_and_stats(tmp_path):
+    cache = SearchCache(make_backend(tmp_path))
+    await cache.aset("k", {"answer": "ok"}, 0.1)
+    assert (await cache.astats())["size"] == 1
+
+    await cache.aclear()
+
+    assert await cache.aget("k") is None
+    assert (await cache.astats())["size"] == 0
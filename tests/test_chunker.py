@@ -0,0 +1,42 @@
+import pytest
+
+from backend.chunker import build_jsonl, estimate_tokens, split_record, validate_jsonl
+
+
+def test_short_record_is_kept_whole():
+    record = "Вопрос: как дела?\nХорошо."
+    assert split_record(record, 800) == [record]
+
+
+def test_run_on_paragraph_is_split_by_token_windows():
+    record = "Вопрос: длинный?\n" + " ".join(["слово"] * 2000)
+
+    chunks = split_record(record, 800)
+
+    assert len(chunks) == 3
+    assert all(estimate_tokens(chunk) <= 800 for chunk in chunks)
+    assert all(chunk.startswith("Вопрос: длинный?\n") for chunk in chunks)
+
+
+def test_record_without_header_line_is_split():
+    chunks = split_record(" ".join(["слово"] * 2000), 800)
+
+    assert len(chunks) == 3
+    assert all(estimate_tokens(chunk) <= 800 for chunk in chunks)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_jsonl_output_passes_validation(tmp_path, workers):
+    source = tmp_path / "faq.txt"
+    source.write_text(
+        "Вопрос: короткий?\nОтвет в одну строку.\n\n"
+        "Вопрос: с предложениями?\n" + "Это предложение. " * 600 + "\n\n"
+        "Вопрос: таблица?\n" + " | ".join(["ячейка"] * 1500) + "\n",
+        encoding="utf-8"
+    )
+    output = tmp_path / "faq.jsonl"
+
+    count = build_jsonl(source, output, max_tokens=200, workers=workers)
+
+    assert count > 3
+    assert list(validate_jsonl(output, max_tokens=200)) == []
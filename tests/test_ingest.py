@@ -0,0 +1,43 @@
+"""Пакетная загрузка корпуса: ошибки отдельных файлов"""
+
+import asyncio
+
+import pytest
+
+from backend import ingest, main
+from backend.registry import FileManifest
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    root = tmp_path / "corpus"
+    root.mkdir()
+    for i in range(12):
+        (root / f"doc{i:02d}.txt").write_text(f"Документ {i}", encoding="utf-8")
+    monkeypatch.setattr(main, "file_manifest", FileManifest(tmp_path / "manifest.json"))
+    return root
+
+
+async def test_vanished_files_do_not_stop_workers(corpus, tmp_path, monkeypatch):
+    uploaded = []
+
+    async def fake_upload(path, content_type, extra_body=None):
+        uploaded.append(path.name)
+        return f"file-{path.stem}"
+
+    monkeypatch.setattr(main, "upload_path", fake_upload)
+    # Файлы исчезают после обхода директории, но до загрузки
+    files = list(ingest.iter_files(corpus, ingest.DEFAULT_EXTENSIONS))
+    monkeypatch.setattr(ingest, "iter_files", lambda root, extensions: iter(files))
+    for path in files[:6]:
+        path.unlink()
+
+    state = ingest.IngestState(tmp_path / "state.json")
+    stats = ingest.Stats()
+    await asyncio.wait_for(ingest.upload_all(corpus, ingest.DEFAULT_EXTENSIONS, state, stats, workers=2), 10)
+
+    statuses = {key: entry["status"] for key, entry in state.data["files"].items()}
+    assert sorted(uploaded) == [path.name for path in files[6:]]
+    assert [statuses[path.name] for path in files] == ["failed"] * 6 + ["uploaded"] * 6
+    assert stats.failed == 6
+    assert "No such file" in state.data["files"][files[0].name]["error"]
@@ -0,0 +1,167 @@
+"""Лимиты арендаторов и очередь допуска к upstream"""
+
+import json
+
+import httpx
+import pytest
+
+from backend import limits, main
+from backend.limits import AdmissionQueue, Overloaded, RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемое время для ведер токенов"""
+    now = [1000.0]
+    monkeypatch.setattr(limits.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_spends_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock[0] += 1
+    assert bucket.take(2) == 0
+    assert bucket.take() == pytest.approx(0.5)
+
+
+def test_token_bucket_never_exceeds_burst(clock):
+    bucket = TokenBucket(rate=10, burst=2)
+    clock[0] += 60
+
+    assert bucket.take(2) == 0
+    assert bucket.take() > 0
+
+
+def test_rate_limiter_rejects_with_retry_after(clock):
+    limiter = RateLimiter(rate=1, burst=2)
+    limiter.check("a")
+    limiter.check("a")
+
+    with pytest.raises(Overloaded) as e:
+        limiter.check("a")
+    assert e.value.retry_after == pytest.approx(1)
+    assert e.value.retry_after_header == "1"
+    # Ведра арендаторов независимы
+    limiter.check("b")
+    assert limiter.rejected == 1
+
+
+def test_rate_limiter_charges_full_cost(clock):
+    limiter = RateLimiter(rate=1, burst=10)
+
+    limiter.check("a", cost=8)
+    with pytest.raises(Overloaded):
+        limiter.check("a", cost=8)
+    assert limiter.stats()["tenants"]["a"]["tokens"] == 2
+
+    clock[0] += 6
+    limiter.check("a", cost=8)
+
+
+def test_rate_limiter_different_overrides_share_tenant_bucket(clock):
+    limiter = RateLimiter(rate=1, burst=2)
+
+    # Коллекции одного арендатора с разными burst чередуются
+    admitted = 0
+    for i in range(1000):
+        try:
+            limiter.check("team", rate=1, burst=2 + i % 2)
+            admitted += 1
+        except Overloaded:
+            pass
+    assert admitted == 2
+
+    clock[0] += 1
+    limiter.check("team", rate=1, burst=3)
+    with pytest.raises(Overloaded):
+        limiter.check("team", rate=1, burst=2)
+
+
+def test_rate_limiter_overrides_and_disabling(clock):
+    limiter = RateLimiter(rate=0, burst=1)
+    for _ in range(100):
+        limiter.check("a", cost=50)
+
+    limiter.check("b", rate=1, burst=1)
+    with pytest.raises(Overloaded):
+        limiter.check("b", rate=1, burst=1)
+    # Новые настройки применяются без пополнения ведра
+    with pytest.raises(Overloaded):
+        limiter.check("b", rate=10, burst=5)
+    clock[0] += 0.1
+    limiter.check("b", rate=10, burst=5)
+    assert limiter.stats()["tenants"]["b"]["burst"] == 5
+
+
+async def test_rate_limiter_acquire_waits_for_token(clock, monkeypatch):
+    async def sleep(seconds):
+        clock[0] += seconds
+
+    monkeypatch.setattr(limits.asyncio, "sleep", sleep)
+    limiter = RateLimiter(rate=2, burst=1)
+
+    assert await limiter.acquire("a") == 0
+    assert await limiter.acquire("a") == pytest.approx(0.5)
+    assert await limiter.acquire("a") == pytest.approx(0.5)
+    assert limiter.stats()["delayed"] == 2
+    assert limiter.rejected == 0
+    with pytest.raises(ValueError):
+        await limiter.acquire("b", rate=1, burst=0.5)
+
+
+def test_admission_queue_rejects_when_full():
+    queue = AdmissionQueue(max_pending=2)
+
+    with queue.admit(), queue.admit():
+        assert queue.pending == 2
+        with pytest.raises(Overloaded):
+            with queue.admit():
+                pass
+        with pytest.raises(Overloaded):
+            queue.check()
+
+    assert queue.pending == 0
+    assert queue.stats()["admitted"] == 2
+    assert queue.stats()["rejected"] == 2
+    queue.check()
+
+
+def test_admission_queue_releases_on_error():
+    queue = AdmissionQueue(max_pending=1)
+
+    with pytest.raises(RuntimeError):
+        with queue.admit():
+            raise RuntimeError("upstream")
+
+    assert queue.pending == 0
+    with queue.admit():
+        pass
+
+
+def test_admission_queue_unlimited():
+    queue = AdmissionQueue(max_pending=0)
+
+    with queue.admit(), queue.admit(), queue.admit():
+        assert queue.pending == 3
+
+
+async def test_batch_larger_than_burst_runs_at_tenant_rate(monkeypatch):
+    monkeypatch.setattr(main, "tenant_limiter", RateLimiter(rate=50, burst=2))
+    queries = ["виртуальная машина", "снимок диска", "тарификация", "операционные системы"]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/search/batch", json={
+            "queries": queries, "modes": ["local"], "retrieval_only": True, "concurrency": 4
+        })
+
+    assert response.status_code == 200
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(item["index"] for item in items) == [0, 1, 2, 3]
+    assert not [item for item in items if "error" in item]
+    # Запас - два запроса, остальные пары дождались токенов
+    assert len([item for item in items if "waited" in item]) == 2
+    assert main.tenant_limiter.stats()["delayed"] == 2
@@ -0,0 +1,43 @@
+"""Поиск в локальном режиме через кэш"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from backend import main
+from backend.cache import MemoryCacheBackend, SearchCache
+
+
+@pytest.fixture
+def chunks_file(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    path = data_dir / main.CHUNKS_MODE_FILE
+    shutil.copy(main.get_data_path(main.CHUNKS_MODE_FILE), path)
+    monkeypatch.setattr(main, "get_data_path", lambda filename: data_dir / filename)
+    monkeypatch.setattr(main, "search_cache", SearchCache(MemoryCacheBackend()))
+    return path
+
+
+async def test_local_results_follow_file_changes(chunks_file):
+    query = "Как создать виртуальную машину?"
+    first, cached = await main.cached_search(query, "local", main.LOCAL_STORE_ID, 3, retrieval_only=True)
+    assert not cached
+    assert (await main.cached_search(query, "local", main.LOCAL_STORE_ID, 3, retrieval_only=True))[1]
+
+    # Найденные чанки удалены из файла: кэш не должен их вернуть
+    found = {chunk["text"] for chunk in first["chunks"]}
+    assert found
+    lines = [
+        line for line in chunks_file.read_text(encoding="utf-8").splitlines()
+        if json.loads(line)["body"] not in found
+    ]
+    chunks_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    stat = chunks_file.stat()
+    os.utime(chunks_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    second, cached = await main.cached_search(query, "local", main.LOCAL_STORE_ID, 3, retrieval_only=True)
+    assert not cached
+    assert found.isdisjoint(chunk["text"] for chunk in second["chunks"])
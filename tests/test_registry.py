@@ -0,0 +1,42 @@
+"""Реестры на JSON файлах"""
+
+import threading
+import time
+
+from backend.registry import StoreRegistry, locked
+
+
+def test_snapshot_does_not_wait_for_writer_lock(tmp_path):
+    registry = StoreRegistry(tmp_path / "registry.json")
+    registry.register("key", "chunks", "vs_1", {}, "hash")
+
+    # Другой воркер держит блокировку реестра (например, во время записи)
+    held, release = threading.Event(), threading.Event()
+
+    def writer():
+        with locked(registry.path):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    held.wait(5)
+    try:
+        started = time.perf_counter()
+        assert registry.active_snapshot("chunks")["store_id"] == "vs_1"
+        assert time.perf_counter() - started < 1
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_snapshot_follows_atomic_replace(tmp_path):
+    registry = StoreRegistry(tmp_path / "registry.json")
+    assert registry.active_snapshot("chunks") is None
+
+    registry.register("a", "chunks", "vs_1", {}, "h1")
+    assert registry.active_snapshot("chunks")["store_id"] == "vs_1"
+
+    # Запись из другого процесса: отдельный объект реестра на том же файле
+    StoreRegistry(registry.path).register("b", "chunks", "vs_2", {}, "h2", replaces="vs_1")
+    assert registry.active_snapshot("chunks")["store_id"] == "vs_2"
@@ -0,0 +1,102 @@
+from backend.shards import (
+    merge_files, plan_sync, previous_files, record_shard, shard_digest, split_shards,
+    stale_file_ids, write_shard
+)
+
+
+def write_records(path, bodies):
+    path.write_text("".join(f'{{"body": "{body}"}}\n' for body in bodies), encoding="utf-8")
+    return path
+
+
+def state_for(shards):
+    """Состояние прошлой синхронизации: file_id совпадает с хэшем шарда"""
+    return {
+        shard: {"hash": shard_digest(lines), "file_id": f"file-{shard_digest(lines)[:8]}", "records": len(lines)}
+        for shard, lines in shards.items()
+    }
+
+
+def test_split_shards_keeps_every_record_in_its_hash_shard(tmp_path):
+    path = write_records(tmp_path / "chunks.jsonl", [f"record {i}" for i in range(50)])
+
+    shards = split_shards(path, 4)
+
+    assert sum(len(lines) for lines in shards.values()) == 50
+    for shard, lines in shards.items():
+        assert all(record_shard(line, 4) == int(shard) for line in lines)
+
+
+def test_split_shards_ignores_line_endings_and_blank_lines(tmp_path):
+    unix = tmp_path / "unix.jsonl"
+    unix.write_bytes(b'{"body": "a"}\n{"body": "b"}\n')
+    windows = tmp_path / "windows.jsonl"
+    windows.write_bytes(b'{"body": "a"}\r\n\r\n{"body": "b"}\r\n')
+
+    assert split_shards(unix, 4) == split_shards(windows, 4)
+
+
+def test_plan_sync_detects_added_changed_removed(tmp_path):
+    bodies = [f"record {i}" for i in range(40)]
+    old = split_shards(write_records(tmp_path / "old.jsonl", bodies), 8)
+
+    bodies[0] = "record 0 edited"
+    new = split_shards(write_records(tmp_path / "new.jsonl", bodies[:-1]), 8)
+    plan = plan_sync(state_for(old), new)
+
+    touched = plan["added"] + plan["changed"] + plan["removed"]
+    assert 1 <= len(touched) <= 3
+    assert sorted(touched + plan["unchanged"]) == sorted(set(old) | set(new))
+
+
+def test_plan_sync_without_state_adds_everything(tmp_path):
+    shards = split_shards(write_records(tmp_path / "chunks.jsonl", ["a", "b", "c"]), 4)
+
+    plan = plan_sync(None, shards)
+
+    assert sorted(plan["added"]) == sorted(shards)
+    assert plan["changed"] == plan["removed"] == plan["unchanged"] == []
+
+
+def test_previous_files_resets_on_shard_count_change():
+    state = {"count": 16, "files": {"0": {"hash": "h", "file_id": "f", "records": 1}}}
+
+    assert previous_files(state, 16) == state["files"]
+    assert previous_files(state, 8) == {}
+    assert previous_files(None, 16) == {}
+
+
+def test_sync_transition_reuses_unchanged_and_drops_stale():
+    old = {
+        "0": {"hash": "h0", "file_id": "f0", "records": 1},
+        "1": {"hash": "h1", "file_id": "f1", "records": 1},
+        "2": {"hash": "h2", "file_id": "f2", "records": 1},
+    }
+    plan = {"added": ["3"], "changed": ["1"], "removed": ["2"], "unchanged": ["0"]}
+    uploaded = {
+        "1": {"hash": "h1b", "file_id": "f1b", "records": 2},
+        "3": {"hash": "h3", "file_id": "f3", "records": 1},
+    }
+
+    files = merge_files(old, plan, uploaded)
+
+    assert files == {"0": old["0"], "1": uploaded["1"], "3": uploaded["3"]}
+    assert stale_file_ids(old, plan, files) == ["f1", "f2"]
+
+
+def test_stale_file_ids_keeps_files_still_in_use():
+    # Загрузка дедуплицируется по содержимому: новый шард может получить прежний ID
+    old = {"1": {"hash": "h1", "file_id": "shared", "records": 1}}
+    plan = {"added": ["2"], "changed": [], "removed": ["1"], "unchanged": []}
+    files = {"2": {"hash": "h1", "file_id": "shared", "records": 1}}
+
+    assert stale_file_ids(old, plan, files) == []
+
+
+def test_write_shard_roundtrip(tmp_path):
+    lines = [b'{"body": "a"}', b'{"body": "b"}']
+
+    path = write_shard(tmp_path, "chunks", "7", lines)
+
+    assert path.name == "chunks.shard007.jsonl"
+    assert path.read_bytes().splitlines() == lines
@@ -0,0 +1,137 @@
+"""Синхронизация индекса chunks (blue_green и in_place) поверх mock-сервера"""
+
+import asyncio
+import json
+import shutil
+
+import pytest
+
+from backend import main
+from backend.registry import FileManifest, StoreRegistry
+
+
+@pytest.fixture
+def chunks_data(tmp_path, monkeypatch, mock_upstream):
+    """Копия файла chunks, чистые реестр и манифест, пустое состояние режима"""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    shutil.copy(main.get_data_path(main.CHUNKS_MODE_FILE), data_dir / main.CHUNKS_MODE_FILE)
+    monkeypatch.setattr(main, "get_data_path", lambda filename: data_dir / filename)
+    monkeypatch.setattr(main, "store_registry", StoreRegistry(tmp_path / "registry.json"))
+    monkeypatch.setattr(main, "file_manifest", FileManifest(tmp_path / "manifest.json"))
+    monkeypatch.setattr(main, "SYNC_RETIRE_DELAY", 0)
+    # Семафоры привязываются к event loop, а у каждого теста он свой
+    monkeypatch.setattr(main, "upstream_semaphores", {
+        name: asyncio.Semaphore(limit) for name, limit in main.UPSTREAM_CONCURRENCY.items()
+    })
+    monkeypatch.setitem(main.vector_stores, "chunks", None)
+    monkeypatch.setitem(main.active_store_versions, "chunks", None)
+    return data_dir / main.CHUNKS_MODE_FILE
+
+
+def edit_records(path, update_index: int = 0, remove_index: int = 1):
+    """Изменить одну запись и удалить другую"""
+    lines = path.read_text(encoding="utf-8").splitlines()
+    record = json.loads(lines[update_index])
+    record["body"] += "\nДополнение."
+    lines[update_index] = json.dumps(record, ensure_ascii=False)
+    del lines[remove_index]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def store_file_ids(mock_upstream, store_id: str) -> set[str]:
+    return set(mock_upstream.stores[store_id]["files"])
+
+
+def state_file_ids(state: dict) -> set[str]:
+    return {entry["file_id"] for entry in state["files"].values()}
+
+
+async def wait_retired():
+    while main.retire_tasks:
+        await asyncio.gather(*main.retire_tasks)
+
+
+async def test_first_sync_uploads_all_shards(chunks_data, mock_upstream):
+    result = await main.sync_chunks_store("in_place")
+
+    # Без прошлого состояния in_place сводится к blue_green
+    assert result["strategy"] == "blue_green"
+    assert result["previous_store_id"] is None
+    assert result["shards"]["added"] == len(main.split_shards(chunks_data, main.CHUNKS_SHARD_COUNT))
+    entry = main.store_registry.active("chunks")
+    assert entry["store_id"] == result["store_id"] == main.vector_stores["chunks"]
+    assert state_file_ids(entry["shards"]) == store_file_ids(mock_upstream, result["store_id"])
+
+    assert (await main.sync_chunks_store("in_place"))["status"] == "unchanged"
+
+
+async def test_blue_green_builds_new_store_and_retires_old(chunks_data, mock_upstream):
+    first = await main.sync_chunks_store("blue_green")
+    old_state = main.store_registry.active("chunks")["shards"]
+
+    edit_records(chunks_data)
+    result = await main.sync_chunks_store("blue_green")
+
+    assert result["previous_store_id"] == first["store_id"]
+    assert result["store_id"] != first["store_id"]
+    assert 1 <= result["shards"]["changed"] + result["shards"]["removed"] + result["shards"]["added"] <= 3
+    entry = main.store_registry.active("chunks")
+    assert entry["store_id"] == result["store_id"]
+    new_ids = state_file_ids(entry["shards"])
+    assert new_ids == store_file_ids(mock_upstream, result["store_id"])
+    # Неизмененные шарды переиспользуются без повторной загрузки
+    unchanged = [shard for shard, e in entry["shards"]["files"].items() if e == old_state["files"].get(shard)]
+    assert len(unchanged) == result["shards"]["unchanged"]
+
+    await wait_retired()
+    assert first["store_id"] not in mock_upstream.stores
+    assert first["store_id"] not in {e["store_id"] for e in main.store_registry.read()["stores"].values()}
+    stale = state_file_ids(old_state) - new_ids
+    assert stale and not stale & set(mock_upstream.files)
+    assert new_ids <= set(mock_upstream.files)
+
+
+async def test_in_place_updates_store_and_drops_stale_files(chunks_data, mock_upstream):
+    first = await main.sync_chunks_store("blue_green")
+    old_ids = state_file_ids(main.store_registry.active("chunks")["shards"])
+
+    edit_records(chunks_data)
+    result = await main.sync_chunks_store("in_place")
+
+    assert result["strategy"] == "in_place"
+    assert result["store_id"] == first["store_id"]
+    entries = [e for e in main.store_registry.read()["stores"].values() if e["store_id"] == result["store_id"]]
+    assert len(entries) == 1
+    assert entries[0]["data_hash"] == main.hash_file(chunks_data)
+    new_ids = state_file_ids(entries[0]["shards"])
+    assert new_ids == store_file_ids(mock_upstream, result["store_id"])
+    stale = old_ids - new_ids
+    assert stale and not stale & set(mock_upstream.files)
+
+
+async def test_other_worker_adopts_registry_switch(chunks_data, mock_upstream):
+    first = await main.sync_chunks_store("blue_green")
+    assert await main.get_ready_store_id("chunks") == first["store_id"]
+    main.search_cache.set("key", {"results": []}, 0.1)
+
+    # Синхронизацию выполнил другой воркер: локальное состояние не менялось
+    edit_records(chunks_data)
+    result = await main.sync_chunks_store("blue_green")
+    main.vector_stores["chunks"] = first["store_id"]
+    main.search_cache.set("key", {"results": []}, 0.1)
+
+    assert await main.get_ready_store_id("chunks") == result["store_id"]
+    assert main.search_cache.get("key") is None
+    await wait_retired()
+
+
+async def test_restored_worker_ignores_index_of_changed_data(chunks_data, mock_upstream):
+    await main.sync_chunks_store("blue_green")
+    main.vector_stores["chunks"] = None
+    edit_records(chunks_data)
+
+    # Данные изменились после создания индекса: после перезапуска он не используется
+    await main.restore_vector_stores()
+
+    assert await main.adopt_active_store("chunks") is None